@@ -7,6 +7,13 @@
 from machine import Pin, SPI, I2C, ADC
 from ili9341 import Display, color565
 from xpt2046 import Touch
+from agro_stats import AgroStats
+from automatizacion import ReglaRiego, plazos_automatizacion
+from bh1750 import BH1750
+from i2c_bus import BusI2C
+from power import GestorEnergia, MuestreoAdaptativo
+from recovery import EstadoControlador, PuntoControl, Vigilante, arranque_en_caliente, restaurar
+from text_atlas import MotorTexto
 import time
 import math
 # ================== CONFIGURACIÓN DE PINES ==================
@@ -27,7 +34,8 @@ TOUCH_CS   = 10
 # --- Bus I2C (SHT30 + BH1750) ---f
 I2C_SDA = 15
 I2C_SCL = 16
-I2C_FREQ = 100000
+I2C_FREQ = 100000             # Frecuencia mínima (la de respaldo)
+I2C_FREQ_MAX = 400000         # Al arrancar se elige la más alta estable hasta este valor
 
 # --- ADC Humedad de Suelo ---
 # --- Ajustado para 3 sensores en los pines 4, 5, 6
@@ -62,16 +70,42 @@ FERTI_DURACION = 4            # Segundos que dura la fertirrigación
 
 # Ventilador
 TEMP_UMBRAL_FAN = 36          # Grados Celsius para activar el ventilador
+VPD_BANDA_FAN = None          # (min, max) en kPa; si se define, el ventilador también enciende con el VPD (media 1 min) fuera de banda
 UMBRAL_DESCONECTADO = 59000
 
+# Modo doble núcleo: sensores y automatización en un hilo propio (control_core.py)
+MODO_DOBLE_NUCLEO = False
+PERIODO_CONTROL_MS = 100      # Periodo del hilo de control
+
+# Bajo consumo (power.py): pantalla dormida por inactividad y light-sleep entre ticks
+MODO_BAJO_CONSUMO = False
+INACTIVIDAD_PANTALLA_S = 60   # Segundos sin toques antes de apagar la pantalla
+PIN_BACKLIGHT = None          # Pin de la retroiluminación (None si va fija a 3V3)
+TOUCH_IRQ = None              # Pin IRQ del XPT2046 para despertar al tocar (None: sin él)
+MUESTREO_SUELO_MS = (2000, 60000) # Intervalo mín/máx de muestreo del suelo
+MUESTREO_TEMP_MS = (2000, 60000)  # Intervalo mín/máx de muestreo de temperatura
+INFORME_ENERGIA_S = 600       # Cada cuánto se imprime el informe de consumo
+
+# Recuperación ante fallos (recovery.py): watchdog y punto de control en memoria RTC
+WATCHDOG_MS = 8000            # Reinicia el chip si la automatización deja de correr (0: sin watchdog)
+
+# Telemetría: una línea TLM por consola cada TELEMETRIA_S para replay.py (0: desactivada)
+TELEMETRIA_S = 5
+
+# Riego automático: estado (activo, inicio, fin) y regla en automatizacion.py
+regla_riego = ReglaRiego(HUMEDAD_MINIMA_RIEGO, RIEGO_DURACION * 1000, RIEGO_INTERVALO * 1000)
+
 # ---> VARIABLES PARA CONTROLAR TIEMPOS <---
 # Guardarán el tiempo (en milisegundos) de la última acción
-ultimo_riego_fin = 0
 ultimo_ferti_inicio = 0
-riego_activo = False
-riego_inicio_tiempo = 0
 ferti_activo = False
 ferti_inicio_tiempo = 0
+ultima_temp = 0
+ultima_rh = 0
+ultima_lux = 0
+ultima_telemetria = None
+lectura_sht30 = None   # Transacciones I2C programadas aún sin procesar
+lectura_bh1750 = None
 
 # ================== IMPORTAR DATOS DEL LOGO ==================
 try:
@@ -278,54 +312,99 @@ LOGO_GREEN = color565(0, 200, 0)
 # ================== DRIVERS SENSORES ==================
 class SHT30:
     def __init__(self, i2c, addr=0x44):
-        self.i2c = i2c
+        self.i2c = i2c # BusI2C: comando, espera y lectura sin intercalarse con otro hilo
         self.addr = addr
+        self.cmd = bytes([0x2C, 0x06])
 
     def read(self):
-        self.i2c.writeto(self.addr, bytes([0x2C, 0x06]))
-        time.sleep_ms(15)
-        data = self.i2c.readfrom(self.addr, 6)
+        return self.convertir(self.i2c.escribir_leer(self.addr, self.cmd, 6, retardo_ms=15))
+
+    def programar(self):
+        """ Medida programada en el bus: la ejecuta i2c.atender() """
+        return self.i2c.programar(self.addr, self.cmd, 6, retardo_ms=15)
+
+    def recibir(self, transaccion):
+        if transaccion.error is not None:
+            raise transaccion.error
+        return self.convertir(transaccion.resultado)
+
+    @staticmethod
+    def convertir(data):
         t_raw = (data[0] << 8) | data[1]
         rh_raw = (data[3] << 8) | data[4]
         temp_c = -45 + (175 * (t_raw / 65535.0))
         rh = 100 * (rh_raw / 65535.0)
         return temp_c, rh
 
-class BH1750:
-    POWER_ON = 0x01
-    RESET = 0x07
-    CONT_HIGH_RES = 0x10
-
-    def __init__(self, i2c, addr=0x23):
-        self.i2c = i2c
-        self.addr = addr
-        self.i2c.writeto(self.addr, bytes([self.POWER_ON]))
-        time.sleep_ms(10)
-        self.i2c.writeto(self.addr, bytes([self.RESET]))
-        time.sleep_ms(10)
-        self.i2c.writeto(self.addr, bytes([self.CONT_HIGH_RES]))
-        time.sleep_ms(180)
-
-    def read_lux(self):
-        data = self.i2c.readfrom(self.addr, 2)
-        raw = (data[0] << 8) | data[1]
-        lux = raw / 1.2
-        return lux
+# BH1750: ver bh1750.py (autorrango y lectura no bloqueante)
 
 # ================== INICIALIZACIÓN HW ==================
+# Punto de control: tras un reinicio por watchdog o por software se
+# retoma el estado antes de inicializar nada más (sin bienvenida ni
+# calibración), para que los actuadores (activo bajo) vuelvan como
+# estaban en milisegundos. Si no se puede leer, arranque en frío.
+punto_control = PuntoControl()
+estado_previo, ACTUADORES = restaurar(punto_control, arranque_en_caliente(),
+                                      lambda pin, valor: Pin(pin, Pin.OUT, value=valor),
+                                      (PIN_RIEGO, PIN_FERTI, PIN_FAN))
+riego, ferti, fan = ACTUADORES # Índice = bit en el estado de actuadores
+
+if estado_previo is not None:
+    regla_riego.activo = estado_previo.riego_activo
+    regla_riego.inicio = estado_previo.riego_inicio
+    regla_riego.fin = estado_previo.riego_fin
+    ferti_activo = estado_previo.ferti_activo
+    ferti_inicio_tiempo = estado_previo.ferti_inicio
+    print(f"Arranque en caliente: control restaurado a los {time.ticks_ms()} ms")
+
+# Watchdog armado en cuanto los actuadores tienen su estado: si el resto
+# de la inicialización se cuelga con un riego abierto, el chip se reinicia
+vigilante = Vigilante(WATCHDOG_MS) if WATCHDOG_MS else None
+
+def alimentar_vigilante():
+    """ Sólo desde la tarea principal, la que creó el WDT """
+    if vigilante is not None:
+        vigilante.alimentar()
+
 # SPI TFT
 spi_tft = SPI(1, baudrate=10_000_000, mosi=Pin(TFT_MOSI), miso=Pin(TFT_MISO), sck=Pin(TFT_SCK))
 display = Display(spi_tft, cs=Pin(LCD_CS), dc=Pin(LCD_DC), rst=Pin(LCD_RST), width=320, height=240, rotation=270)
+# Texto con atlas de glifos (x1, x2 y dígitos x3): cada cadena en un solo bloque SPI
+texto = MotorTexto(display)
+alimentar_vigilante()
 
 # SPI Touch
 spi_touch = SPI(2, baudrate=1_000_000, mosi=Pin(TOUCH_MOSI), miso=Pin(TOUCH_MISO), sck=Pin(TOUCH_SCK))
 touch = Touch(spi_touch, cs=Pin(TOUCH_CS), width=320, height=240,
               x_min=200, x_max=3900, y_min=200, y_max=3900)
+if estado_previo is not None and estado_previo.calibracion:
+    touch.x_min, touch.x_max, touch.y_min, touch.y_max = estado_previo.calibracion
+    try:
+        touch.set_range(touch.x_min, touch.x_max, touch.y_min, touch.y_max)
+    except:
+        pass
 
-# I2C Sensores
-i2c = I2C(0, sda=Pin(I2C_SDA), scl=Pin(I2C_SCL), freq=I2C_FREQ)
+# I2C Sensores: gestor de bus con reintentos, recuperación de bus atascado
+# y frecuencia negociada al arrancar. Contadores: i2c.estadisticas()
+i2c = BusI2C(lambda f: I2C(0, sda=Pin(I2C_SDA), scl=Pin(I2C_SCL), freq=f),
+             sda=Pin(I2C_SDA), scl=Pin(I2C_SCL),
+             freq_max=I2C_FREQ_MAX, freq_min=I2C_FREQ, dispositivos=(0x44, 0x23))
+alimentar_vigilante()
+print(f"I2C a {i2c.freq // 1000} kHz")
 sht30 = SHT30(i2c)
-bh1750 = BH1750(i2c)
+bh1750 = BH1750(i2c) # No bloquea: la primera medida estará lista en ~180 ms
+
+# Estadísticas agronómicas (VPD, DLI, GDD y ventanas 1 min / 1 h / 24 h)
+agro = AgroStats()
+
+# Muestreo para la automatización: adaptativo sólo en bajo consumo
+if MODO_BAJO_CONSUMO:
+    muestreo_suelo = MuestreoAdaptativo(*MUESTREO_SUELO_MS, umbral=1)
+    muestreo_temp = MuestreoAdaptativo(*MUESTREO_TEMP_MS, umbral=0.3)
+else:
+    muestreo_suelo = MuestreoAdaptativo() # Toca siempre
+    muestreo_temp = MuestreoAdaptativo()
+energia = None # GestorEnergia, se crea antes de main() si MODO_BAJO_CONSUMO
 
 # ADC Suelo
 soil_adcs = [ADC(Pin(p)) for p in SOIL_ADC_PINS]
@@ -335,11 +414,6 @@ for adc in soil_adcs:
     except:
         pass
 
-# Actuadores
-riego = Pin(PIN_RIEGO, Pin.OUT); riego.value(1)
-ferti = Pin(PIN_FERTI, Pin.OUT); ferti.value(1)
-fan   = Pin(PIN_FAN,   Pin.OUT); fan.value(1)
-
 # ================== UI BÁSICA ==================
 # (Funciones de UI sin cambios...)
 def pantalla_bienvenida():
@@ -374,6 +448,7 @@ def pantalla_bienvenida():
             black_value_threshold = 0x0841 
 
             for y_rel in range(LOGO_HEIGHT):
+                alimentar_vigilante() # El logo se dibuja píxel a píxel
                 for x_rel in range(LOGO_WIDTH):
                     index = (y_rel * LOGO_WIDTH + x_rel) * bytes_per_pixel
                     if index + 1 < len(logo_bytes):
@@ -407,6 +482,7 @@ def pantalla_bienvenida():
     timeout_ms = 3000 # Espera máximo 3 segundos por un toque
 
     while time.ticks_diff(time.ticks_ms(), start_time_welcome) < timeout_ms:
+        alimentar_vigilante()
         # ---> USA raw_touch() aquí <---
         if touch.raw_touch(): # raw_touch() devuelve (x,y) o None, no necesita calibración
             start_touch = True
@@ -419,7 +495,7 @@ def pantalla_bienvenida():
 
 def draw_menu():
     display.clear(BLACK)
-    display.draw_text8x8(90, 15, "MENU DE CONTROL", YELLOW, BLACK)
+    texto.draw(90, 15, "MENU DE CONTROL", YELLOW, BLACK, cache=True)
     botones = [
         ("TEMP",        20,  45, RED),
         ("HUMEDAD",     170, 45, BLUE),
@@ -431,7 +507,7 @@ def draw_menu():
     ]
     for txt, x, y, color in botones:
         display.fill_rectangle(x, y, 130, 35, color)
-        display.draw_text8x8(x+8, y+12, txt, BLACK, color)
+        texto.draw(x+8, y+12, txt, BLACK, color, cache=True)
 
 
 def detectar_boton(x, y):
@@ -453,7 +529,7 @@ def detectar_boton(x, y):
 
 def boton_volver():
     display.fill_rectangle(100, 205, 120, 28, RED)
-    display.draw_text8x8(128, 214, "VOLVER", WHITE, RED)
+    texto.draw(128, 214, "VOLVER", WHITE, RED, cache=True)
 
 def manejar_interaccion(button_zones):
     while True:
@@ -465,6 +541,7 @@ def manejar_interaccion(button_zones):
             for name, (x_min, x_max, y_min, y_max) in button_zones.items():
                 if x_min <= x <= x_max and y_min <= y <= y_max:
                     return name
+        check_automation() # Sigue regando (y alimentando el watchdog) mientras espera
         time.sleep(0.3)
 
 # --- Lecturas y pantallas ---
@@ -480,11 +557,15 @@ def pantalla_temp():
     while True: 
         check_automation(); 
         try:
-            t, _ = sht30.read()
+            t, _ = leer_sht30()
             # ---> Ajusta posición del texto para no solapar el logo <---
             text_x = logo_x + logo_size + 40 # Mueve el texto a la derecha del logo
-            display.draw_text8x8(text_x, 90, "Temperatura:", RED, BLACK)
-            display.draw_text8x8(text_x, 110, f"{t:.2f} C   ", RED, BLACK) 
+            texto.draw(text_x, 90, "Temperatura (C):", RED, BLACK, cache=True)
+            texto.draw(text_x, 104, f"{t:6.2f}", RED, BLACK, escala=3) # Ancho fijo: no hace falta borrar
+            t_min, t_max = leer_agro()[:2]
+            if t_min is not None:
+                texto.draw(text_x, 135, f"Min 24h: {t_min:5.1f} C", RED, BLACK)
+                texto.draw(text_x, 150, f"Max 24h: {t_max:5.1f} C", RED, BLACK)
         except Exception as e:
             display.draw_text8x8(20, 100, f"Err SHT30:{e} ", RED, BLACK)
 
@@ -508,26 +589,31 @@ def pantalla_humedad():
     logo_radius = 30     # Radio (tamaño) del logo
     draw_humidity_logo(logo_center_x, logo_center_y, logo_radius)
     # ----------------------
+    # ---> Ajusta posición del texto <---
+    text_x = logo_center_x + logo_radius + 30 # Posición X a la derecha del logo
+    text_y_label = 85 # Posición Y del texto "Humedad (%):"
+    text_y_value = text_y_label + 15 # Posición Y del valor (dígitos x3)
+    con_error = False # Hay un mensaje de error en pantalla
 
     while True: # Bucle de actualización
         check_automation()
         # 1. Leer sensor y mostrar
         try:
-            _, rh = sht30.read()
-            # ---> Ajusta posición del texto <---
-            text_x = logo_center_x + logo_radius + 30 # Posición X a la derecha del logo
-            text_y_label = 85 # Posición Y del texto "Humedad:"
-            text_y_value = text_y_label + 20 # Posición Y del valor
-            
-            # Borra área de texto anterior
-            display.fill_rectangle(text_x - 5, text_y_label - 2, 100, 40, BLACK) 
-            
-            display.draw_text8x8(text_x, text_y_label, "Humedad:", BLUE, BLACK)
-            display.draw_text8x8(text_x, text_y_value, f"{rh:.1f} %", BLUE, BLACK) 
+            _, rh = leer_sht30()
+            if con_error: # El mensaje de error es más ancho que el valor: borrarlo una vez
+                display.fill_rectangle(text_x - 5, text_y_label - 2, 150, 55, BLACK)
+                con_error = False
+            # Etiqueta en caché y valores de ancho fijo: no hace falta borrar el área
+            texto.draw(text_x, text_y_label, "Humedad (%):", BLUE, BLACK, cache=True)
+            texto.draw(text_x, text_y_value, f"{rh:5.1f}", BLUE, BLACK, escala=3)
+            vpd = leer_agro()[2]
+            if vpd is not None:
+                texto.draw(text_x, text_y_value + 30, f"VPD: {vpd:4.2f} kPa", BLUE, BLACK)
         except Exception as e:
-            display.fill_rectangle(text_x - 5, text_y_label - 2, 100, 40, BLACK) 
+            display.fill_rectangle(text_x - 5, text_y_label - 2, 150, 55, BLACK) 
             display.draw_text8x8(text_x, text_y_label, f"Err SHT30:", RED, BLACK) 
             display.draw_text8x8(text_x, text_y_value, f"{e}", RED, BLACK)
+            con_error = True
 
         # 2. Comprobar toque en VOLVER
         pos = touch.get_touch()
@@ -548,27 +634,32 @@ def pantalla_luz():
     logo_center_y = 95   # Y position for the logo center
     logo_radius = 30     # Overall radius (including rays)
     draw_sun_logo(logo_center_x, logo_center_y, logo_radius)
+    # ---> Adjust text position <---
+    text_x = logo_center_x + logo_radius + 30 # X position to the right of the logo
+    text_y_label = 85 # Y position for "Luz (lux):"
+    text_y_value = text_y_label + 15 # Y position for the value (x3 digits)
+    con_error = False # An error message is on screen
     
     while True: # Bucle de actualización
         check_automation()
         # 1. Leer sensor y mostrar
         try:
-            lux = bh1750.read_lux()
-            # ---> Adjust text position <---
-            text_x = logo_center_x + logo_radius + 30 # X position to the right of the logo
-            text_y_label = 85 # Y position for "Luz (lux):"
-            text_y_value = text_y_label + 20 # Y position for the value
-            
-            # Clear previous text area
-            display.fill_rectangle(text_x - 5, text_y_label - 2, 100, 40, BLACK) 
-            
-            display.draw_text8x8(text_x, text_y_label, "Luz (lux):", GREEN, BLACK)
-            display.draw_text8x8(text_x, text_y_value, f"{lux:.0f} lx", GREEN, BLACK) 
+            lux = leer_lux()
+            if con_error: # The error text is wider than the value: clear it once
+                display.fill_rectangle(text_x - 5, text_y_label - 2, 150, 55, BLACK)
+                con_error = False
+            # Cached label and fixed-width values: no need to clear the area
+            texto.draw(text_x, text_y_label, "Luz (lux):", GREEN, BLACK, cache=True)
+            texto.draw(text_x, text_y_value, f"{lux:6.0f}", GREEN, BLACK, escala=3)
+            dli = leer_agro()[3]
+            if dli is not None:
+                texto.draw(text_x, text_y_value + 30, f"DLI: {dli:4.1f} mol/m2d", GREEN, BLACK)
         except Exception as e:
             # Clear text area and show error
-            display.fill_rectangle(text_x - 5, text_y_label - 2, 100, 40, BLACK) 
+            display.fill_rectangle(text_x - 5, text_y_label - 2, 150, 55, BLACK) 
             display.draw_text8x8(text_x, text_y_label, f"Err BH1750:", RED, BLACK) 
             display.draw_text8x8(text_x, text_y_value, f"{e}", RED, BLACK) # Borra errores previos
+            con_error = True
 
         # 2. Comprobar toque en VOLVER
         pos = touch.get_touch()
@@ -592,7 +683,7 @@ def map_sensor(raw, dry=58000, wet=55000): # Calibración unificada
 # ---> CAMBIO: Lógica de pantalla_suelo() actualizada <---
 def pantalla_suelo():
     display.clear(BLACK)
-    display.draw_text8x8(90, 20, "HUMEDAD DE SUELO", YELLOW, BLACK)
+    texto.draw(90, 20, "HUMEDAD DE SUELO", YELLOW, BLACK, cache=True)
 
     logo_width = 10
     logo_height = 25
@@ -609,33 +700,24 @@ def pantalla_suelo():
     draw_soil_logo(logo_x, y3, logo_width, logo_height)
     
     # --- Draw static text labels ---
-    display.draw_text8x8(label_x, y1 + 8, "Sensor Suelo 1:", CYAN, BLACK) # Pin 4
-    display.draw_text8x8(label_x, y2 + 8, "Sensor Suelo 2:", CYAN, BLACK) # Pin 5
-    display.draw_text8x8(label_x, y3 + 8, "Sensor Suelo 3:", CYAN, BLACK) # Pin 6
+    texto.draw(label_x, y1 + 8, "Sensor Suelo 1:", CYAN, BLACK, cache=True) # Pin 4
+    texto.draw(label_x, y2 + 8, "Sensor Suelo 2:", CYAN, BLACK, cache=True) # Pin 5
+    texto.draw(label_x, y3 + 8, "Sensor Suelo 3:", CYAN, BLACK, cache=True) # Pin 6
     
     boton_volver()
     
     while True:
         check_automation()
-        # Sensor 1 (Pin 4)...
         value_x = display.width - 50 
 
-        # Sensor 1
-        raw1 = soil_adcs[0].read_u16(); val1 = 0 if raw1 > UMBRAL_DESCONECTADO else map_sensor(raw1)
-        display.fill_rectangle(value_x, y1 + 8, 40, 8, BLACK) # Clear previous value
-        display.draw_text8x8(value_x, y1 + 8, f"{val1}%", CYAN, BLACK); time.sleep_ms(10)
-        
-        # Sensor 2
-        raw2 = soil_adcs[1].read_u16(); val2 = 0 if raw2 > UMBRAL_DESCONECTADO else map_sensor(raw2)
-        display.fill_rectangle(value_x, y2 + 8, 40, 8, BLACK) # Clear previous value
-        display.draw_text8x8(value_x, y2 + 8, f"{val2}%", CYAN, BLACK); time.sleep_ms(10)
-        
-        # Sensor 3
-        raw3 = soil_adcs[2].read_u16(); val3 = 0 if raw3 > UMBRAL_DESCONECTADO else map_sensor(raw3)
-        display.fill_rectangle(value_x, y3 + 8, 40, 8, BLACK) # Clear previous value
-        display.draw_text8x8(value_x, y3 + 8, f"{val3}%", CYAN, BLACK)
-        
-        print(f"Valores Crudos ADC: Pin 4={raw1}  Pin 5={raw2}  Pin 6={raw3}")
+        try:
+            raw1, raw2, raw3 = leer_suelo()
+            for raw, y in ((raw1, y1), (raw2, y2), (raw3, y3)):
+                val = 0 if raw > UMBRAL_DESCONECTADO else map_sensor(raw)
+                texto.draw(value_x, y + 8, f"{val:3d}%", CYAN, BLACK) # Ancho fijo: sin borrar antes
+            print(f"Valores Crudos ADC: Pin 4={raw1}  Pin 5={raw2}  Pin 6={raw3}")
+        except OSError:
+            pass # El hilo de control aún no ha publicado ninguna lectura
         
         # Comprueba si se ha tocado el botón "VOLVER"
         pos = touch.get_touch()
@@ -658,20 +740,20 @@ def pantalla_toggle(nombre, pin_obj, color):
     estado_actual = pin_obj.value() 
 
     # Dibuja el nombre del actuador
-    display.draw_text8x8(70, 70, f"{nombre}", color, BLACK)
+    texto.draw(70, 70, f"{nombre}", color, BLACK, escala=2, cache=True)
     
     # ---> CORRECCIÓN AQUÍ <---
     # Muestra el estado inicial CORRECTAMENTE basado en el valor del pin
     if estado_actual == estado_real_on: # Si el pin está en BAJO (0), muestra ON
-        display.draw_text8x8(70, 95, "Estado: ON  ", color, BLACK)
+        texto.draw(70, 95, "Estado: ON  ", color, BLACK, cache=True)
     else: # Si el pin está en ALTO (1), muestra OFF
-        display.draw_text8x8(70, 95, "Estado: OFF ", color, BLACK)
+        texto.draw(70, 95, "Estado: OFF ", color, BLACK, cache=True)
         
     # Botones ON / OFF
     display.fill_rectangle(50, 140, 80, 30, GREEN)
-    display.draw_text8x8(75, 150, "ON", BLACK, GREEN)
+    texto.draw(75, 150, "ON", BLACK, GREEN, cache=True)
     display.fill_rectangle(190, 140, 80, 30, RED)
-    display.draw_text8x8(210, 150, "OFF", WHITE, RED)
+    texto.draw(210, 150, "OFF", WHITE, RED, cache=True)
     boton_volver()
     
     botones_toogle = {
@@ -682,15 +764,15 @@ def pantalla_toggle(nombre, pin_obj, color):
     
     accion = manejar_interaccion(botones_toogle)
     if accion == "on":
-        pin_obj.value(0)
+        fijar_actuador(pin_obj, 0)
         estado = 0
-        display.draw_text8x8(70, 95, "Estado: ON  ", color, BLACK)
+        texto.draw(70, 95, "Estado: ON  ", color, BLACK, cache=True)
         check_automation()
         time.sleep(0.5)
     elif accion == "off":
-        pin_obj.value(1)
+        fijar_actuador(pin_obj, 1)
         estado = 1
-        display.draw_text8x8(70, 95, "Estado: OFF ", color, BLACK)
+        texto.draw(70, 95, "Estado: OFF ", color, BLACK, cache=True)
         check_automation()
         time.sleep(0.5)
     elif accion == "volver":
@@ -698,72 +780,249 @@ def pantalla_toggle(nombre, pin_obj, color):
 
 # ---> NUEVA FUNCIÓN PARA LA LÓGICA AUTOMÁTICA <---
 def check_automation():
-    global ultimo_riego_fin, ultimo_ferti_inicio, riego_activo, riego_inicio_tiempo, ferti_activo, ferti_inicio_tiempo
+    """ Desde la UI (tarea principal): un tick de automatización y el
+    watchdog, que en el ESP32 sólo se puede alimentar desde esta tarea.
+    En modo doble núcleo la automatización corre en el hilo de control
+    y aquí sólo se recogen sus lecturas. """
+    if nucleo_control is not None:
+        atender_nucleo_control()
+        return
+    automatizar()
+    alimentar_vigilante()
+
+def automatizar():
+    global ultimo_ferti_inicio, ferti_activo, ferti_inicio_tiempo
+    global ultima_temp, ultima_rh, ultima_lux, lectura_sht30, lectura_bh1750
 
     ahora = time.ticks_ms() # Obtiene el tiempo actual en milisegundos
 
     # 1. RIEGO (Basado en Sensor 2 - Pin 5)
     try:
-        raw_humedad_s2 = soil_adcs[1].read_u16()
-        if raw_humedad_s2 > UMBRAL_DESCONECTADO:
-            humedad_s2 = 0 
-        else:
-            humedad_s2 = map_sensor(raw_humedad_s2)
-
-        # Comprobar si hay que activar el riego
-        if not riego_activo and humedad_s2 <= HUMEDAD_MINIMA_RIEGO:
-            if time.ticks_diff(ahora, ultimo_riego_fin) > RIEGO_INTERVALO * 1000:
+        # En bajo consumo el suelo se muestrea a ritmo adaptativo
+        if muestreo_suelo.toca(ahora):
+            raw_humedad_s2 = soil_adcs[1].read_u16()
+            if raw_humedad_s2 > UMBRAL_DESCONECTADO:
+                humedad_s2 = 0 
+            else:
+                humedad_s2 = map_sensor(raw_humedad_s2)
+            muestreo_suelo.registrar(ahora, humedad_s2)
+
+            # Comprobar si hay que activar el riego
+            if regla_riego.muestra(ahora, humedad_s2):
                 print("AUTO: Activando RIEGO")
                 riego.value(0) 
-                riego_activo = True
-                riego_inicio_tiempo = ahora
-                draw_status_bar() # Actualiza icono en barra superior
+                avisar_cambio_actuadores() # Actualiza icono en barra superior
 
         # Comprobar si hay que desactivar el riego
-        if riego_activo and time.ticks_diff(ahora, riego_inicio_tiempo) >= RIEGO_DURACION * 1000:
+        if regla_riego.vencido(ahora):
             print("AUTO: Desactivando RIEGO")
             riego.value(1) 
-            riego_activo = False
-            ultimo_riego_fin = ahora 
-            draw_status_bar() 
+            avisar_cambio_actuadores() 
 
     except Exception as e:
         print(f"Error en lógica de riego: {e}")
 
+    # 2. BUS I2C: las lecturas periódicas se programan y atender() ejecuta
+    # seguidas las que vencen en esta ranura (la del BH1750, al terminar
+    # su conversión). En bajo consumo la temperatura se muestrea a ritmo
+    # adaptativo; mientras no toca medir, el ventilador sigue como está.
+    try:
+        if lectura_sht30 is None and muestreo_temp.toca(ahora):
+            lectura_sht30 = sht30.programar()
+        if lectura_bh1750 is None:
+            lectura_bh1750 = bh1750.programar() # Lanza la conversión si no hay ninguna
+        i2c.atender()
+    except Exception as e:
+        print(f"Error en bus I2C: {e}")
+
     # 3. VENTILADOR (Basado en temperatura)
     try:
-        # Solo lee temp si no estamos ya en la pantalla de temperatura
-        # (para evitar lecturas duplicadas rápidas)
-        # Esto es opcional, pero puede ser bueno.
-        # Necesitaríamos una variable global para saber en qué pantalla estamos.
-        # Por simplicidad, lo dejamos leer siempre por ahora.
-        temp_actual, _ = sht30.read()
-
-        if temp_actual > TEMP_UMBRAL_FAN:
-            if fan.value() == 1: 
-                print("AUTO: Activando VENTILADOR (Temp alta)")
-                fan.value(0) 
-                draw_status_bar()
-        else:
-            if fan.value() == 0: 
-                print("AUTO: Desactivando VENTILADOR (Temp normal)")
-                fan.value(1) 
-                draw_status_bar()
+        if lectura_sht30 is not None and lectura_sht30.hecho:
+            transaccion, lectura_sht30 = lectura_sht30, None
+            temp_actual, ultima_rh = sht30.recibir(transaccion)
+            ultima_temp = temp_actual
+            muestreo_temp.registrar(ahora, temp_actual)
+            agro.actualizar(ahora, temp=temp_actual, rh=ultima_rh)
+
+            # Regla opcional por VPD: ventila si el aire está fuera de banda
+            vpd_fuera = False
+            if VPD_BANDA_FAN is not None and agro.vpd.m1.n():
+                vpd = agro.vpd.m1.media()
+                vpd_fuera = vpd < VPD_BANDA_FAN[0] or vpd > VPD_BANDA_FAN[1]
+
+            if temp_actual > TEMP_UMBRAL_FAN or vpd_fuera:
+                if fan.value() == 1: 
+                    print("AUTO: Activando VENTILADOR (Temp alta)" if temp_actual > TEMP_UMBRAL_FAN else "AUTO: Activando VENTILADOR (VPD fuera de banda)")
+                    fan.value(0) 
+                    avisar_cambio_actuadores()
+            else:
+                if fan.value() == 0: 
+                    print("AUTO: Desactivando VENTILADOR (Temp normal)")
+                    fan.value(1) 
+                    avisar_cambio_actuadores()
     except Exception as e:
         print(f"Error en lógica de ventilador: {e}")
 
+    # 4. LUZ (alimenta DLI y estadísticas). Sólo cuando hay conversión nueva;
+    # en modos de medida única, el siguiente programar() lanza otra.
+    try:
+        if lectura_bh1750 is not None and lectura_bh1750.hecho:
+            transaccion, lectura_bh1750 = lectura_bh1750, None
+            ultima_lux = bh1750.recibir(transaccion)
+            agro.actualizar(ahora, lux=ultima_lux)
+    except Exception as e:
+        print(f"Error leyendo luz: {e}")
+
+    emitir_telemetria(ahora)
+
+# time.time_ns() cuenta desde 2000 en los ports embebidos de MicroPython
+EPOCA_UNIX_MS = 946_684_800_000 if time.gmtime(0)[0] == 2000 else 0
+if TELEMETRIA_S and time.gmtime()[0] < 2020: # Lo pone en hora Thonny al conectar, no este programa
+    print("Aviso: RTC sin poner en hora; las líneas TLM no llevarán fecha (ingest.py las guarda aparte)")
+
+def emitir_telemetria(ahora):
+    """ TLM,ticks_ms,epoch_ms,temp,rh,lux,suelo1,suelo2,suelo3,bits
+    (epoch_ms: reloj RTC en ms desde 1970 UTC; suelo en crudo) """
+    global ultima_telemetria
+    if not TELEMETRIA_S:
+        return
+    if ultima_telemetria is not None and time.ticks_diff(ahora, ultima_telemetria) < TELEMETRIA_S * 1000:
+        return
+    ultima_telemetria = ahora
+    try:
+        s1, s2, s3 = (adc.read_u16() for adc in soil_adcs)
+        reloj_ms = time.time_ns() // 1_000_000 + EPOCA_UNIX_MS
+        print(f"TLM,{ahora},{reloj_ms},{ultima_temp:.2f},{ultima_rh:.1f},{ultima_lux or 0:.1f},{s1},{s2},{s3},{bits_actuadores()}")
+    except Exception as e:
+        print(f"Error en telemetría: {e}")
+
+def avisar_cambio_actuadores():
+    guardar_estado()
+    # En modo doble núcleo la UI redibuja la barra al ver cambiar L_ACT
+    if nucleo_control is None:
+        draw_status_bar()
+
+def guardar_estado():
+    """ Punto de control en memoria RTC: actuadores, temporizadores y calibración """
+    estado = EstadoControlador()
+    estado.actuadores = bits_actuadores()
+    estado.riego_activo = regla_riego.activo
+    estado.riego_inicio = regla_riego.inicio
+    estado.riego_fin = regla_riego.fin
+    estado.ferti_activo = ferti_activo
+    estado.ferti_inicio = ferti_inicio_tiempo
+    estado.calibracion = (touch.x_min, touch.x_max, touch.y_min, touch.y_max)
+    try:
+        punto_control.guardar(estado)
+    except Exception as e:
+        print(f"Error guardando punto de control: {e}")
+
+
+# ================== MODO DOBLE NÚCLEO ==================
+nucleo_control = None
+ultima_lectura = None     # Última lectura recibida del hilo de control
+hay_lectura = False
+bits_mostrados = -1       # Estado de actuadores dibujado en la barra
+ticks_control = -1        # Ticks del hilo de control vistos al alimentar el watchdog
+
+def bits_actuadores():
+    bits = 0
+    for i, pin in enumerate(ACTUADORES):
+        if pin.value() == 0: # Activo bajo
+            bits |= 1 << i
+    return bits
+
+def paso_control(lectura):
+    """ Tick del hilo de control: automatización + publicación de lecturas """
+    automatizar()
+    lectura[L_TEMP] = ultima_temp
+    lectura[L_RH] = ultima_rh
+    lectura[L_LUX] = ultima_lux
+    for i, campo in enumerate((L_S1, L_S2, L_S3)):
+        lectura[campo] = soil_adcs[i].read_u16() # En crudo: la UI aplica map_sensor()
+    lectura[L_ACT] = bits_actuadores()
+    # Agregados de AgroStats: la UI no lo toca mientras este hilo lo actualiza
+    for campo, valor in zip((L_TMIN, L_TMAX, L_VPD, L_DLI, L_GDD), agregados_agro()):
+        lectura[campo] = float("nan") if valor is None else valor
+
+def aplicar_comando(comando):
+    """ Ejecuta en el hilo de control un comando manual de la UI """
+    ACTUADORES[comando[C_ACTUADOR]].value(comando[C_VALOR])
+    guardar_estado()
+
+def atender_nucleo_control():
+    """ Desde la UI: recoge la última lectura, refresca la barra si hace
+    falta y alimenta el watchdog si el hilo de control ha avanzado desde
+    la vez anterior (si se atasca, el watchdog reinicia el chip) """
+    global hay_lectura, bits_mostrados, ticks_control
+    if nucleo_control.ticks != ticks_control:
+        ticks_control = nucleo_control.ticks
+        alimentar_vigilante()
+    if nucleo_control.lecturas.ultimo(ultima_lectura):
+        hay_lectura = True
+        bits = int(ultima_lectura[L_ACT])
+        if bits != bits_mostrados:
+            bits_mostrados = bits
+            draw_status_bar()
+
+def leer_sht30():
+    if nucleo_control is None:
+        return sht30.read()
+    if not hay_lectura:
+        raise OSError("sin lectura")
+    return ultima_lectura[L_TEMP], ultima_lectura[L_RH]
+
+def leer_suelo():
+    """ Lecturas crudas (ADC u16) de los tres sensores de suelo """
+    if nucleo_control is None:
+        return [adc.read_u16() for adc in soil_adcs]
+    if not hay_lectura:
+        raise OSError("sin lectura")
+    return [int(ultima_lectura[campo]) for campo in (L_S1, L_S2, L_S3)]
+
+def agregados_agro():
+    """ (mín 24 h, máx 24 h, VPD 1 min, DLI 24 h, GDD); None si aún no hay datos """
+    return (agro.temp.d1.minimo(), agro.temp.d1.maximo(), agro.vpd.m1.media(),
+            agro.dli_24h(), agro.gdd)
+
+def leer_agro():
+    if nucleo_control is None:
+        return agregados_agro()
+    if not hay_lectura:
+        raise OSError("sin lectura")
+    valores = [ultima_lectura[campo] for campo in (L_TMIN, L_TMAX, L_VPD, L_DLI, L_GDD)]
+    return tuple(None if v != v else v for v in valores) # NaN -> None
+
+def leer_lux():
+    if nucleo_control is None:
+        # check_automation() ya recoge cada conversión nueva
+        return bh1750.lux if bh1750.lux is not None else bh1750.read_lux()
+    if not hay_lectura:
+        raise OSError("sin lectura")
+    return ultima_lectura[L_LUX]
+
+def fijar_actuador(pin_obj, valor):
+    """ Cambio manual: en modo doble núcleo lo aplica el hilo de control """
+    if nucleo_control is None:
+        pin_obj.value(valor)
+        guardar_estado()
+    else:
+        nucleo_control.enviar(ACTUADORES.index(pin_obj), valor)
+
 
 # ================== LOOP PRINCIPAL ==================
 # (Sin cambios)
 def main():
-    pantalla_bienvenida()
     draw_menu()
+    ultimo_informe = time.ticks_ms()
     
     while True:
         check_automation() 
 
         # --- COMPROBACIÓN DE TOQUE EN LA PANTALLA --- 
         pos = touch.get_touch()
+        if pos and energia is not None and energia.actividad():
+            pos = None # Ese toque sólo despierta la pantalla
         if pos:
             x, y = pos; x, y = y, x # Tu transformación
             print(f"Toque detectado en: X={x}, Y={y}")
@@ -782,9 +1041,18 @@ def main():
             if sel:
                 draw_menu()
                 draw_status_bar() 
+                if energia is not None:
+                    energia.actividad() # Volver de una pantalla cuenta como uso
 
-        # Pequeña pausa para no saturar el CPU y permitir otras tareas
-        time.sleep_ms(100) # Revisa sensores y toque 10 veces por segundo
+        if energia is None:
+            # Pequeña pausa para no saturar el CPU y permitir otras tareas
+            time.sleep_ms(100) # Revisa sensores y toque 10 veces por segundo
+        else:
+            # Duerme hasta el próximo plazo de la automatización
+            energia.dormir_hasta(plazos_automatizacion((muestreo_suelo, muestreo_temp), regla_riego))
+            if time.ticks_diff(time.ticks_ms(), ultimo_informe) >= INFORME_ENERGIA_S * 1000:
+                ultimo_informe = time.ticks_ms()
+                print(f"ENERGIA: {energia.informe()}")
 
 # (Funciones de calibración y barra de estado sin cambios)
 def pantalla_calibracion():
@@ -802,6 +1070,7 @@ def pantalla_calibracion():
         display.fill_circle(xd, yd, 5, RED)
         display.draw_text8x8(20, 40, msg, WHITE, BLACK)
         while True:
+            alimentar_vigilante() # La espera del toque no tiene límite
             pos = touch.raw_touch()
             if pos:
                 rx, ry = pos
@@ -816,6 +1085,7 @@ def pantalla_calibracion():
         touch.set_range(touch.x_min, touch.x_max, touch.y_min, touch.y_max)
     except:
         pass
+    guardar_estado()
     display.clear(BLACK)
     display.draw_text8x8(40, 100, "Calibracion guardada", GREEN, BLACK)
     time.sleep(1)
@@ -836,15 +1106,15 @@ def draw_status_bar():
     display.fill_rectangle(0,0,320,12,BLACK) # Limpia la barra
     
     # FAN
-    display.draw_text8x8(190, 2,"FAN", WHITE, BLACK)
+    texto.draw(190, 2, "FAN", WHITE, BLACK, cache=True)
     draw_actuator_status_icon(fan, 225, 6) # Dibuja icono al lado
 
     # RIEGO
-    display.draw_text8x8(240, 2,"RIE", WHITE, BLACK)
+    texto.draw(240, 2, "RIE", WHITE, BLACK, cache=True)
     draw_actuator_status_icon(riego, 275, 6) # Dibuja icono al lado
 
     # FERTIRRIEGO
-    display.draw_text8x8(290, 2,"FER", WHITE, BLACK)
+    texto.draw(290, 2, "FER", WHITE, BLACK, cache=True)
     draw_actuator_status_icon(ferti, 320-10, 6) # Dibuja icono al lado
 
 # actualizar draw_menu para mostrar barra de estado
@@ -857,13 +1127,34 @@ def draw_menu_with_status():
 # sustituir en runtime
 draw_menu = draw_menu_with_status
 
-# Ejecuta calibración al inicio si el usuario lo desea
-pantalla_bienvenida()
-should_calibrate = pantalla_bienvenida() 
-
-# Ejecuta calibración SOLO si hubo toque durante bienvenida
-if should_calibrate:
-    pantalla_calibracion()
-
-# iniciar loop principal
+# Ejecuta calibración al inicio si el usuario lo desea (no en arranque en caliente)
+if estado_previo is None:
+    should_calibrate = pantalla_bienvenida() 
+
+    # Ejecuta calibración SOLO si hubo toque durante bienvenida
+    if should_calibrate:
+        pantalla_calibracion()
+
+# Arranca el hilo de control si está habilitado
+if MODO_DOBLE_NUCLEO:
+    from control_core import (NucleoControl, ANCHO_LECTURA, C_ACTUADOR, C_VALOR,
+                              L_TEMP, L_RH, L_LUX, L_S1, L_S2, L_S3, L_ACT,
+                              L_TMIN, L_TMAX, L_VPD, L_DLI, L_GDD)
+    ultima_lectura = [0.0] * ANCHO_LECTURA
+    nucleo_control = NucleoControl(paso_control, aplicar_comando, periodo_ms=PERIODO_CONTROL_MS)
+    nucleo_control.iniciar()
+
+# Gestor de energía (no compatible con el hilo de control: el light-sleep lo pararía)
+if MODO_BAJO_CONSUMO and not MODO_DOBLE_NUCLEO:
+    energia = GestorEnergia(display,
+                            backlight=Pin(PIN_BACKLIGHT, Pin.OUT, value=1) if PIN_BACKLIGHT is not None else None,
+                            touch_irq=Pin(TOUCH_IRQ, Pin.IN, Pin.PULL_UP) if TOUCH_IRQ is not None else None,
+                            inactividad_ms=INACTIVIDAD_PANTALLA_S * 1000)
+
+# Punto de control inicial (sustituye al de una sesión anterior)
+guardar_estado()
+if vigilante is not None and energia is not None: # Despertar a alimentarlo antes de que venza
+    energia.sueno_max_ms = min(energia.sueno_max_ms, WATCHDOG_MS // 2)
+
+# iniciar loop principal (tras un reinicio por fallo, directo al menú)
 main()
\ No newline at end of file
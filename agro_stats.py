@@ -0,0 +1,266 @@
+# Estadísticas agronómicas incrementales
+# ------------------------------------------------------------
+# Déficit de presión de vapor (VPD), integral diaria de luz (DLI),
+# grados día de crecimiento (GDD) y min/max/media/desviación en
+# ventanas móviles de 1 min, 1 h y 24 h.
+#
+# Cada ventana agrupa las muestras en un número fijo de cubetas:
+# sumas acumuladas para media/desviación y colas monótonas para
+# min/max, así que cada actualización es O(1) amortizado y la
+# memoria no depende de la frecuencia de muestreo.
+from array import array
+import math
+from compat import ticks_diff
+
+MS_MINUTO = 60_000
+MS_HORA = 3_600_000
+MS_DIA = 86_400_000
+
+# Conversión aproximada lux -> PPFD (umol/m2/s) para luz solar
+FACTOR_PPFD_SOL = 0.0185
+# Huecos mayores que esto no se integran en DLI ni GDD
+HUECO_MAXIMO_MS = 10 * MS_MINUTO
+
+
+def presion_saturacion(temp_c):
+    """ Presión de vapor de saturación en kPa (ecuación de Tetens) """
+    return 0.6108 * math.exp(17.27 * temp_c / (temp_c + 237.3))
+
+
+def vpd_kpa(temp_c, rh):
+    """ Déficit de presión de vapor del aire en kPa """
+    return presion_saturacion(temp_c) * (1 - rh / 100)
+
+
+class _ColaMonotona:
+    """ Cola de capacidad fija con valores monótonos: el frente es el
+    mínimo (o máximo) de las cubetas que siguen en la ventana. """
+
+    def __init__(self, capacidad, es_max):
+        self._seq = array('i', [0] * capacidad)
+        self._val = array('f', [0] * capacidad)
+        self._cap = capacidad
+        self._es_max = es_max
+        self._ini = 0
+        self._n = 0
+
+    def vaciar(self):
+        self._ini = 0
+        self._n = 0
+
+    def push(self, seq, valor):
+        cap = self._cap
+        # Quitar por detrás los valores que ya nunca serán extremo
+        while self._n:
+            j = (self._ini + self._n - 1) % cap
+            v = self._val[j]
+            if (v <= valor) if self._es_max else (v >= valor):
+                self._n -= 1
+            else:
+                break
+        j = (self._ini + self._n) % cap
+        self._seq[j] = seq
+        self._val[j] = valor
+        self._n += 1
+
+    def expirar(self, seq_min):
+        while self._n and self._seq[self._ini] < seq_min:
+            self._ini = (self._ini + 1) % self._cap
+            self._n -= 1
+
+    def frente(self):
+        return self._val[self._ini] if self._n else None
+
+
+class VentanaMovil:
+    """ Estadísticas de los últimos `duracion_ms`, con resolución de
+    duracion_ms / cubetas. La ventana efectiva abarca las cubetas
+    cerradas más la cubeta en curso. Los tiempos deben ser monótonos
+    (ms sin vuelta de contador, ver AgroStats). """
+
+    def __init__(self, duracion_ms, cubetas=60):
+        self.duracion_ms = duracion_ms
+        self.ancho_ms = duracion_ms // cubetas
+        self.cubetas = cubetas
+        # Cubetas cerradas, indexadas por seq % cubetas
+        self._n = array('i', [0] * cubetas)
+        self._suma = array('f', [0] * cubetas)
+        self._suma2 = array('f', [0] * cubetas)
+        self._min = _ColaMonotona(cubetas + 1, False)
+        self._max = _ColaMonotona(cubetas + 1, True)
+        self._ref = None  # Desplazamiento para no perder precisión en float32
+        self.reiniciar()
+
+    def reiniciar(self):
+        for i in range(self.cubetas):
+            self._n[i] = 0
+            self._suma[i] = 0
+            self._suma2[i] = 0
+        self._min.vaciar()
+        self._max.vaciar()
+        self._seq = None
+        self._tn = 0
+        self._ts = 0.0
+        self._ts2 = 0.0
+        self._abrir_cubeta()
+
+    def _abrir_cubeta(self):
+        self._an = 0
+        self._as = 0.0
+        self._as2 = 0.0
+        self._amin = 0.0
+        self._amax = 0.0
+
+    def _cerrar_cubeta(self):
+        seq = self._seq
+        i = seq % self.cubetas
+        # La ranura contenía la cubeta que sale de la ventana
+        self._tn += self._an - self._n[i]
+        self._ts += self._as - self._suma[i]
+        self._ts2 += self._as2 - self._suma2[i]
+        self._n[i] = self._an
+        self._suma[i] = self._as
+        self._suma2[i] = self._as2
+        if self._an:
+            self._min.push(seq, self._amin)
+            self._max.push(seq, self._amax)
+        self._min.expirar(seq - self.cubetas + 1)
+        self._max.expirar(seq - self.cubetas + 1)
+        if i == self.cubetas - 1:
+            # Una vez por vuelta se recalculan los totales para que el
+            # error de sumar y restar no se acumule indefinidamente
+            self._tn = sum(self._n)
+            self._ts = sum(self._suma)
+            self._ts2 = sum(self._suma2)
+        self._seq = seq + 1
+        self._abrir_cubeta()
+
+    def agregar(self, t_ms, valor):
+        seq = t_ms // self.ancho_ms
+        if self._seq is None:
+            self._seq = seq
+        elif seq - self._seq > self.cubetas:
+            # Hueco más largo que la ventana: todo lo anterior caducó
+            self.reiniciar()
+            self._seq = seq
+        while self._seq < seq:
+            self._cerrar_cubeta()
+        if self._ref is None:
+            self._ref = valor
+        x = valor - self._ref
+        if self._an == 0 or valor < self._amin:
+            self._amin = valor
+        if self._an == 0 or valor > self._amax:
+            self._amax = valor
+        self._an += 1
+        self._as += x
+        self._as2 += x * x
+
+    def n(self):
+        return self._tn + self._an
+
+    def media(self):
+        n = self.n()
+        if not n:
+            return None
+        return self._ref + (self._ts + self._as) / n
+
+    def desviacion(self):
+        n = self.n()
+        if not n:
+            return None
+        m = (self._ts + self._as) / n
+        var = (self._ts2 + self._as2) / n - m * m
+        return math.sqrt(var) if var > 0 else 0.0
+
+    def minimo(self):
+        v = self._min.frente()
+        if self._an and (v is None or self._amin < v):
+            v = self._amin
+        return v
+
+    def maximo(self):
+        v = self._max.frente()
+        if self._an and (v is None or self._amax > v):
+            v = self._amax
+        return v
+
+
+class Serie:
+    """ Una magnitud con sus ventanas de 1 min, 1 h y 24 h """
+
+    def __init__(self, cubetas=60):
+        self.m1 = VentanaMovil(MS_MINUTO, cubetas)
+        self.h1 = VentanaMovil(MS_HORA, cubetas)
+        self.d1 = VentanaMovil(MS_DIA, cubetas)
+        self.ultimo = None
+
+    def agregar(self, t_ms, valor):
+        self.ultimo = valor
+        self.m1.agregar(t_ms, valor)
+        self.h1.agregar(t_ms, valor)
+        self.d1.agregar(t_ms, valor)
+
+
+class AgroStats:
+    """ Motor de estadísticas alimentado con las lecturas de SHT30 y BH1750.
+    actualizar() recibe time.ticks_ms() y lleva su propio reloj monótono,
+    por lo que la vuelta del contador de ticks no afecta a las ventanas.
+    El "día" de dli_hoy son periodos de 24 h desde el arranque. """
+
+    def __init__(self, temp_base_gdd=10.0, factor_ppfd=FACTOR_PPFD_SOL, cubetas=60):
+        self.temp_base_gdd = temp_base_gdd
+        self.factor_ppfd = factor_ppfd
+        self.temp = Serie(cubetas)
+        self.rh = Serie(cubetas)
+        self.vpd = Serie(cubetas)
+        self.lux = Serie(cubetas)
+        self.gdd = 0.0          # Grados día acumulados desde el arranque
+        self.dli_hoy = 0.0      # mol/m2 del día en curso
+        self.dli_ayer = None    # mol/m2 del último día completo
+        self._t = 0             # ms monótonos desde el primer dato
+        self._ticks = None
+        self._fin_dia = MS_DIA
+        self._t_temp = None     # (t, valor) de la última temperatura
+        self._t_lux = None      # (t, ppfd) del último lux
+
+    def _reloj(self, ahora_ms):
+        if self._ticks is not None:
+            self._t += ticks_diff(ahora_ms, self._ticks)
+        self._ticks = ahora_ms
+        while self._t >= self._fin_dia:
+            self.dli_ayer = self.dli_hoy
+            self.dli_hoy = 0.0
+            self._fin_dia += MS_DIA
+        return self._t
+
+    def actualizar(self, ahora_ms, temp=None, rh=None, lux=None):
+        t = self._reloj(ahora_ms)
+        if temp is not None:
+            if self._t_temp is not None:
+                dt = t - self._t_temp[0]
+                if dt <= HUECO_MAXIMO_MS:
+                    exceso = self._t_temp[1] - self.temp_base_gdd
+                    if exceso > 0:
+                        self.gdd += exceso * dt / MS_DIA
+            self._t_temp = (t, temp)
+            self.temp.agregar(t, temp)
+            if rh is not None:
+                self.vpd.agregar(t, vpd_kpa(temp, rh))
+        if rh is not None:
+            self.rh.agregar(t, rh)
+        if lux is not None:
+            ppfd = lux * self.factor_ppfd
+            if self._t_lux is not None:
+                dt = t - self._t_lux[0]
+                if dt <= HUECO_MAXIMO_MS:
+                    self.dli_hoy += self._t_lux[1] * dt / 1000 / 1_000_000
+            self._t_lux = (t, ppfd)
+            self.lux.agregar(t, lux)
+
+    def dli_24h(self):
+        """ DLI estimado con la media de lux de las últimas 24 h (mol/m2/d) """
+        media = self.lux.d1.media()
+        if media is None:
+            return None
+        return media * self.factor_ppfd * 86400 / 1_000_000
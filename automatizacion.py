@@ -0,0 +1,52 @@
+# Regla de riego automático y plazos de la automatización
+# ------------------------------------------------------------
+# El riego se abre cuando la humedad del suelo baja del mínimo (si ya
+# pasó el intervalo desde el último) y se cierra al cumplir su
+# duración. La usan automatizar() en el dispositivo y sim.py, que
+# la ejercita junto al gestor de energía sobre un reloj virtual.
+#
+# Los instantes son ticks_ms de un pasado que puede ser lejano (un
+# punto de control restaurado, días sin regar): un ticks_diff negativo
+# significa que pasó más de medio periodo y cuenta como muy antiguo.
+from compat import ticks_diff, ticks_add
+
+
+class ReglaRiego:
+    def __init__(self, humedad_minima, duracion_ms, intervalo_ms):
+        self.humedad_minima = humedad_minima
+        self.duracion_ms = duracion_ms
+        self.intervalo_ms = intervalo_ms
+        self.activo = False
+        self.inicio = 0   # ticks_ms de la última apertura
+        self.fin = 0      # ticks_ms del último cierre
+
+    def muestra(self, ahora, humedad):
+        """ Nueva lectura del suelo (%). True si hay que abrir el riego. """
+        if self.activo or humedad > self.humedad_minima:
+            return False
+        if 0 <= ticks_diff(ahora, self.fin) <= self.intervalo_ms:
+            return False
+        self.activo = True
+        self.inicio = ahora
+        return True
+
+    def vencido(self, ahora):
+        """ True si el riego en curso cumplió su duración y hay que cerrarlo """
+        if not self.activo or 0 <= ticks_diff(ahora, self.inicio) < self.duracion_ms:
+            return False
+        self.activo = False
+        self.fin = ahora
+        return True
+
+    def plazo(self):
+        """ Instante (ticks_ms) en que hay que cerrar el riego, o None """
+        return ticks_add(self.inicio, self.duracion_ms) if self.activo else None
+
+
+def plazos_automatizacion(muestreos, riego):
+    """ Instantes (ticks_ms) en que automatizar() tiene trabajo: la
+    próxima muestra de cada MuestreoAdaptativo y el fin del riego en
+    curso, que no se puede retrasar. """
+    plazos = [m.proximo for m in muestreos]
+    plazos.append(riego.plazo())
+    return plazos
@@ -0,0 +1,174 @@
+# Driver BH1750 (luz ambiente, I2C)
+# ------------------------------------------------------------
+# - API no bloqueante: start() lanza una conversión, poll() indica si
+#   ya terminó y fetch() lee el resultado. read_lux() es la versión
+#   bloqueante (espera como mucho el tiempo de una conversión).
+#   Con un BusI2C, programar()/recibir() dejan la lectura programada
+#   para cuando termine la conversión (ver i2c_bus.py).
+# - Autorrango: ajusta el tiempo de medida (MTreg, 31..254) y pasa
+#   entre H y H2 para cubrir de ~0.06 lx a ~120 klx sin saturar.
+# - Modos de una sola medida: el sensor se apaga solo al terminar.
+# El constructor no espera: sólo enciende el sensor y lanza la
+# primera conversión.
+from compat import ticks_ms, ticks_diff, ticks_add, sleep_ms
+
+
+class BH1750:
+    POWER_DOWN = 0x00
+    POWER_ON = 0x01
+    RESET = 0x07
+    CONT_HIGH_RES = 0x10      # 1 lx, 120 ms (máx 180 ms)
+    CONT_HIGH_RES2 = 0x11     # 0.5 lx, 120 ms (máx 180 ms)
+    CONT_LOW_RES = 0x13       # 4 lx, 16 ms (máx 24 ms)
+    ONE_TIME_HIGH_RES = 0x20
+    ONE_TIME_HIGH_RES2 = 0x21
+    ONE_TIME_LOW_RES = 0x23
+
+    MTREG_MIN = 31
+    MTREG_DEFAULT = 69
+    MTREG_MAX = 254
+
+    # Umbrales de autorrango sobre la cuenta cruda (0..65535)
+    RAW_ALTO = 60000          # Por encima: acortar la medida
+    RAW_BAJO = 10000          # Por debajo: alargar la medida
+    RAW_OBJETIVO = 30000
+
+    def __init__(self, i2c, addr=0x23, mode=CONT_HIGH_RES, autorange=True):
+        self.i2c = i2c
+        self.addr = addr
+        self.mode = mode
+        self.autorange = autorange
+        self.mtreg = self.MTREG_DEFAULT
+        self.raw = None
+        self.lux = None           # Último valor leído
+        self.saturado = False     # True si la última lectura es sólo una cota inferior
+        self._buf = bytearray(2)
+        self._cmd = bytearray(1)
+        self._mtreg_pendiente = False
+        self._midiendo = False
+        self._listo = 0
+        self._comando(self.POWER_ON)
+        self._comando(self.RESET)
+        self.start()
+
+    def _comando(self, cmd):
+        self._cmd[0] = cmd
+        self.i2c.writeto(self.addr, self._cmd)
+
+    def continuo(self):
+        return (self.mode & 0xF0) == 0x10
+
+    def conversion_ms(self):
+        """ Tiempo máximo de conversión con el modo y MTreg actuales """
+        base = 24 if (self.mode & 0x03) == 0x03 else 180
+        return (base * self.mtreg + self.MTREG_DEFAULT - 1) // self.MTREG_DEFAULT
+
+    def set_mode(self, mode):
+        self.mode = mode
+        self._midiendo = False
+        self.start()
+
+    def set_mtreg(self, mtreg):
+        mtreg = max(self.MTREG_MIN, min(self.MTREG_MAX, mtreg))
+        if mtreg != self.mtreg:
+            self.mtreg = mtreg
+            self._mtreg_pendiente = True
+
+    def start(self):
+        """ Lanza una conversión (en modo continuo, la reinicia) """
+        if not self.continuo():
+            self._comando(self.POWER_ON)  # Tras una medida única el sensor queda apagado
+        if self._mtreg_pendiente:
+            self._comando(0x40 | (self.mtreg >> 5))
+            self._comando(0x60 | (self.mtreg & 0x1F))
+            self._mtreg_pendiente = False
+        self._comando(self.mode)
+        self._midiendo = True
+        self._listo = ticks_add(ticks_ms(), self.conversion_ms())
+
+    def midiendo(self):
+        """ True si hay una conversión en curso o terminada sin leer.
+        En los modos de medida única pasa a False tras fetch(). """
+        return self._midiendo
+
+    def poll(self):
+        """ True si hay una conversión terminada sin leer """
+        return self._midiendo and ticks_diff(ticks_ms(), self._listo) >= 0
+
+    def fetch(self):
+        """ Lee la conversión terminada; None si aún no está lista """
+        if not self.poll():
+            return None
+        self.i2c.readfrom_into(self.addr, self._buf)
+        return self._procesar(self._buf)
+
+    def _procesar(self, datos):
+        raw = (datos[0] << 8) | datos[1]
+        lux = raw / 1.2 * self.MTREG_DEFAULT / self.mtreg
+        if (self.mode & 0x03) == 0x01:
+            lux /= 2
+        self.raw = raw
+        self.lux = lux
+        self.saturado = raw >= 0xFFFF
+
+        cambio = self.autorange and self._autorrango(raw)
+        if self.continuo():
+            if cambio:
+                self.start()
+            else:
+                # El registro se refresca con cada periodo de medida
+                self._listo = ticks_add(ticks_ms(), self.conversion_ms())
+        else:
+            self._midiendo = False
+        return lux
+
+    def programar(self):
+        """ Programa en el BusI2C la lectura de la conversión en curso
+        para cuando termine (si no hay ninguna, la lanza). Tras
+        bus.atender(), recibir(transaccion) la procesa como fetch(). """
+        if not self._midiendo:
+            self.start()
+        espera = max(0, ticks_diff(self._listo, ticks_ms()))
+        return self.i2c.programar(self.addr, n=2, en_ms=espera)
+
+    def recibir(self, transaccion):
+        if transaccion.error is not None:
+            raise transaccion.error
+        return self._procesar(transaccion.resultado)
+
+    def _autorrango(self, raw):
+        """ Ajusta MTreg/resolución para la próxima medida. True si cambió. """
+        mode = self.mode
+        mtreg = self.mtreg
+        if (mode & 0x03) == 0x03:
+            return False  # Baja resolución: rango fijo
+        if raw > self.RAW_ALTO:
+            if (mode & 0x03) == 0x01:
+                self.mode = mode & ~0x01          # H2 -> H duplica el rango
+            elif raw >= 0xFFFF:
+                self.set_mtreg(self.MTREG_MIN)    # Saturado: al rango máximo
+            else:
+                self.set_mtreg(mtreg * self.RAW_OBJETIVO // raw)
+        elif raw < self.RAW_BAJO:
+            if mtreg < self.MTREG_MAX:
+                self.set_mtreg(mtreg * self.RAW_OBJETIVO // max(raw, 1))
+            elif (mode & 0x03) == 0x00:
+                self.mode = mode | 0x01           # H -> H2 para poca luz
+        return self.mode != mode or self._mtreg_pendiente
+
+    def read_lux(self):
+        """ Lectura bloqueante. Si satura, repite con el rango ajustado. """
+        for _ in range(3):
+            if not self._midiendo:
+                self.start()
+            espera = ticks_diff(self._listo, ticks_ms())
+            if espera > 0:
+                sleep_ms(espera)
+            lux = self.fetch()
+            if not self.saturado or not self.autorange or self.mtreg == self.MTREG_MIN:
+                return lux
+        return lux
+
+    def power_down(self):
+        self._comando(self.POWER_DOWN)
+        self._midiendo = False
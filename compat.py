@@ -0,0 +1,38 @@
+# Primitivas de tiempo compartidas por los módulos del invernadero
+# ------------------------------------------------------------
+# En MicroPython se usan las de `time` directamente. En CPython
+# (pruebas y simulación en el PC) se emulan con perf_counter, con
+# el mismo contrato: contadores que dan la vuelta y ticks_diff()
+# para restarlos.
+import time
+
+try:
+    from time import ticks_ms, ticks_us, ticks_diff, ticks_add, sleep_ms, sleep_us
+    MICROPYTHON = True
+except ImportError:
+    MICROPYTHON = False
+
+    _TICKS_PERIOD = 1 << 30
+    _TICKS_HALF = _TICKS_PERIOD // 2
+    _t0 = time.perf_counter()
+
+    def ticks_ms():
+        return int((time.perf_counter() - _t0) * 1000) % _TICKS_PERIOD
+
+    def ticks_us():
+        return int((time.perf_counter() - _t0) * 1000000) % _TICKS_PERIOD
+
+    def ticks_diff(a, b):
+        d = (a - b) % _TICKS_PERIOD
+        return d - _TICKS_PERIOD if d >= _TICKS_HALF else d
+
+    def ticks_add(t, delta):
+        return (t + delta) % _TICKS_PERIOD
+
+    def sleep_ms(ms):
+        if ms > 0:
+            time.sleep(ms / 1000)
+
+    def sleep_us(us):
+        if us > 0:
+            time.sleep(us / 1000000)
@@ -0,0 +1,242 @@
+# Modo doble núcleo: sensado y control en un hilo propio
+# ------------------------------------------------------------
+# El hilo de control lee sensores y ejecuta la automatización con
+# periodo fijo; la UI sólo dibuja. Se comunican por dos anillos
+# preasignados de un productor y un consumidor (lecturas hacia la
+# UI, comandos hacia el control), sin cerrojos en el camino caliente.
+#
+# Nota: en el port ESP32 de MicroPython los hilos comparten el GIL,
+# así que el hilo de control no corre en paralelo real con la UI,
+# pero ya no espera a que termine un redibujado completo: sólo al
+# siguiente cambio de GIL. El mismo código corre en CPython.
+from array import array
+import _thread
+from compat import ticks_us, ticks_diff, ticks_add, sleep_us
+
+# Campos de cada lectura publicada por el hilo de control
+L_TEMP = 0
+L_RH = 1
+L_LUX = 2
+L_S1 = 3       # suelo en crudo (ADC u16)
+L_S2 = 4
+L_S3 = 5
+L_ACT = 6      # bits de actuadores encendidos (1=riego, 2=ferti, 4=fan)
+L_JITTER = 7   # retraso del tick respecto a su instante previsto (us)
+# Agregados agronómicos (AgroStats vive en el hilo de control; NaN si aún no hay datos)
+L_TMIN = 8     # temperatura mínima 24 h
+L_TMAX = 9     # temperatura máxima 24 h
+L_VPD = 10     # VPD medio del último minuto (kPa)
+L_DLI = 11     # DLI estimado 24 h (mol/m2/d)
+L_GDD = 12     # grados día acumulados
+ANCHO_LECTURA = 13
+
+# Campos de cada comando enviado por la UI
+C_ACTUADOR = 0  # índice del actuador
+C_VALOR = 1     # valor del pin (activo bajo: 0 = ON)
+ANCHO_COMANDO = 2
+
+
+class AnilloSPSC:
+    """ Anillo de un productor y un consumidor sobre un array plano.
+    Toda la memoria se reserva al crearlo. El productor sólo escribe
+    _cabeza y el consumidor sólo _cola; los índices corren en
+    [0, 2*capacidad) para distinguir lleno de vacío sin contadores
+    que crezcan (en MicroPython un int grande reserva memoria). """
+
+    def __init__(self, capacidad, ancho, tipo='f'):
+        if capacidad < 1 or capacidad & (capacidad - 1):
+            raise ValueError("capacidad debe ser potencia de 2")
+        self._buf = array(tipo, [0] * (capacidad * ancho))
+        self._capacidad = capacidad
+        self._mascara = capacidad - 1
+        self._mascara_idx = 2 * capacidad - 1
+        self._ancho = ancho
+        self._cabeza = 0
+        self._cola = 0
+        self.descartados = 0  # elementos perdidos por anillo lleno
+
+    def __len__(self):
+        return (self._cabeza - self._cola) & self._mascara_idx
+
+    def push(self, valores):
+        """ Productor: copia `valores` al anillo. False si está lleno. """
+        cabeza = self._cabeza
+        if ((cabeza - self._cola) & self._mascara_idx) == self._capacidad:
+            self.descartados += 1
+            return False
+        ancho = self._ancho
+        base = (cabeza & self._mascara) * ancho
+        buf = self._buf
+        for i in range(ancho):
+            buf[base + i] = valores[i]
+        # Publicar el índice sólo después de escribir los datos
+        self._cabeza = (cabeza + 1) & self._mascara_idx
+        return True
+
+    def pop(self, destino):
+        """ Consumidor: copia el elemento más antiguo en `destino`. """
+        cola = self._cola
+        if cola == self._cabeza:
+            return False
+        ancho = self._ancho
+        base = (cola & self._mascara) * ancho
+        buf = self._buf
+        for i in range(ancho):
+            destino[i] = buf[base + i]
+        self._cola = (cola + 1) & self._mascara_idx
+        return True
+
+    def ultimo(self, destino):
+        """ Consumidor: vacía el anillo dejando en `destino` el más reciente. """
+        hubo = False
+        while self.pop(destino):
+            hubo = True
+        return hubo
+
+
+class NucleoControl:
+    """ Ejecuta `paso(lectura)` cada `periodo_ms` en un hilo aparte.
+    `paso` lee sensores, aplica la automatización y rellena la lista
+    `lectura` (ANCHO_LECTURA campos) que se publica a la UI.
+    `aplicar(comando)` ejecuta en el hilo de control los comandos
+    que la UI encola con enviar(). """
+
+    def __init__(self, paso, aplicar=None, periodo_ms=100, capacidad=16):
+        self._paso = paso
+        self._aplicar = aplicar
+        self.periodo_us = periodo_ms * 1000
+        self.lecturas = AnilloSPSC(capacidad, ANCHO_LECTURA, 'f')
+        self.comandos = AnilloSPSC(capacidad, ANCHO_COMANDO, 'i')
+        self._lectura = [0.0] * ANCHO_LECTURA
+        self._comando = [0] * ANCHO_COMANDO
+        self._comando_ui = [0] * ANCHO_COMANDO
+        self._activo = False
+        self._corriendo = False
+        self._ident = None
+        self.errores = 0
+        self.reset_estadisticas()
+
+    def reset_estadisticas(self):
+        self.ticks = 0
+        self.jitter_max_us = 0
+        self.jitter_suma_us = 0
+
+    def jitter_medio_us(self):
+        return self.jitter_suma_us // self.ticks if self.ticks else 0
+
+    def en_hilo_control(self):
+        return self._ident is not None and _thread.get_ident() == self._ident
+
+    def iniciar(self):
+        if self._activo:
+            return
+        self._activo = True
+        self._corriendo = True
+        _thread.start_new_thread(self._bucle, ())
+
+    def detener(self, timeout_ms=2000):
+        """ Pide al hilo que termine y espera a que salga del bucle.
+        True si terminó antes de `timeout_ms`. """
+        self._activo = False
+        inicio = ticks_us()
+        while self._corriendo:
+            if ticks_diff(ticks_us(), inicio) >= timeout_ms * 1000:
+                return False
+            sleep_us(1000)
+        return True
+
+    def enviar(self, actuador, valor):
+        """ Desde la UI: encola un comando para el hilo de control. """
+        c = self._comando_ui
+        c[C_ACTUADOR] = actuador
+        c[C_VALOR] = valor
+        return self.comandos.push(c)
+
+    def _bucle(self):
+        self._ident = _thread.get_ident()
+        lectura = self._lectura
+        comando = self._comando
+        periodo = self.periodo_us
+        siguiente = ticks_us()
+        while self._activo:
+            ahora = ticks_us()
+            jitter = ticks_diff(ahora, siguiente)
+            if jitter > self.jitter_max_us:
+                self.jitter_max_us = jitter
+            self.jitter_suma_us += jitter
+            self.ticks += 1
+
+            try:
+                while self.comandos.pop(comando):
+                    if self._aplicar:
+                        self._aplicar(comando)
+                self._paso(lectura)
+            except Exception as e:
+                self.errores += 1
+                print(f"Error en núcleo de control: {e}")
+            lectura[L_JITTER] = jitter
+            self.lecturas.push(lectura)
+
+            siguiente = ticks_add(siguiente, periodo)
+            espera = ticks_diff(siguiente, ticks_us())
+            if espera > 0:
+                sleep_us(espera)
+            elif espera < -periodo:
+                # Vamos más de un periodo tarde: no acumular ticks atrasados
+                siguiente = ticks_us()
+        self._ident = None
+        self._corriendo = False
+
+
+# ================== BENCHMARK DE JITTER ==================
+def medir_jitter(paso, redibujar, duracion_ms=3000, periodo_ms=100):
+    """ Compara el jitter del lazo de control bajo redibujado continuo:
+    primero todo en un hilo (como main()), luego con NucleoControl.
+    Devuelve {modo: (ticks, jitter_medio_us, jitter_max_us)}. """
+    resultados = {}
+    lectura = [0.0] * ANCHO_LECTURA
+    periodo = periodo_ms * 1000
+
+    # 1. Un solo hilo: el control corre entre redibujados
+    inicio = ticks_us()
+    siguiente = inicio
+    ticks = suma = maximo = 0
+    while ticks_diff(ticks_us(), inicio) < duracion_ms * 1000:
+        ahora = ticks_us()
+        if ticks_diff(ahora, siguiente) >= 0:
+            jitter = ticks_diff(ahora, siguiente)
+            ticks += 1
+            suma += jitter
+            if jitter > maximo:
+                maximo = jitter
+            paso(lectura)
+            siguiente = ticks_add(siguiente, periodo)
+        redibujar()
+    resultados["un_hilo"] = (ticks, suma // ticks if ticks else 0, maximo)
+
+    # 2. Hilo de control dedicado
+    nucleo = NucleoControl(paso, periodo_ms=periodo_ms)
+    nucleo.iniciar()
+    inicio = ticks_us()
+    while ticks_diff(ticks_us(), inicio) < duracion_ms * 1000:
+        redibujar()
+        nucleo.lecturas.ultimo(lectura)
+    if not nucleo.detener():
+        print("Aviso: el hilo de control no terminó a tiempo")
+    resultados["doble_nucleo"] = (nucleo.ticks, nucleo.jitter_medio_us(), nucleo.jitter_max_us)
+    return resultados
+
+
+if __name__ == "__main__":
+    # En el PC: redibujado simulado de ~40 ms (similar a display.clear)
+    def redibujar():
+        fin = ticks_add(ticks_us(), 40000)
+        while ticks_diff(fin, ticks_us()) > 0:
+            pass
+
+    def paso(lectura):
+        for i in range(ANCHO_LECTURA):
+            lectura[i] = i
+
+    for modo, (ticks, medio, maximo) in medir_jitter(paso, redibujar).items():
+        print(f"{modo:>13}: {ticks} ticks, jitter medio {medio} us, max {maximo} us")
@@ -0,0 +1,262 @@
+# Gestor del bus I2C compartido (SHT30 + BH1750)
+# ------------------------------------------------------------
+# - Serializa las transacciones de varios hilos con un cerrojo.
+# - Reintenta los errores con espera creciente y acotada.
+# - Si SDA queda atascada en bajo, libera el bus dando pulsos de
+#   reloj por SCL y generando un STOP, y reinicia el periférico.
+# - Al arrancar elige la frecuencia estable más alta (hasta 400 kHz).
+# - Transacciones programadas: las que vencen en la misma ranura se
+#   ejecutan seguidas y las lecturas idénticas pendientes se fusionan.
+# - Contadores de errores y latencia por dispositivo.
+# Expone writeto/readfrom/readfrom_into/scan como machine.I2C, así que
+# los drivers lo usan sin cambios.
+import _thread
+from compat import ticks_ms, ticks_us, ticks_diff, ticks_add, sleep_ms, sleep_us
+
+
+class EstadisticasDispositivo:
+    def __init__(self):
+        self.ok = 0
+        self.errores = 0
+        self.reintentos = 0
+        self.latencia_total_us = 0
+        self.latencia_max_us = 0
+
+    def latencia_media_us(self):
+        return self.latencia_total_us // self.ok if self.ok else 0
+
+    def __repr__(self):
+        return (f"ok={self.ok} err={self.errores} reint={self.reintentos} "
+                f"lat_media={self.latencia_media_us()}us lat_max={self.latencia_max_us}us")
+
+
+class Transaccion:
+    """ Escritura opcional, espera y lectura opcional sobre una dirección """
+
+    def __init__(self, addr, escritura, n, retardo_ms, instante):
+        self.addr = addr
+        self.escritura = escritura
+        self.n = n
+        self.retardo_ms = retardo_ms
+        self.instante = instante
+        self.resultado = None
+        self.error = None
+        self.hecho = False
+        self.avisos = []
+
+    def igual(self, addr, escritura, n, retardo_ms):
+        return (self.addr == addr and self.escritura == escritura
+                and self.n == n and self.retardo_ms == retardo_ms)
+
+
+class BusI2C:
+    FRECUENCIAS = (400000, 200000, 100000)
+
+    def __init__(self, crear_i2c, sda=None, scl=None, freq_max=400000, freq_min=100000,
+                 dispositivos=(), reintentos=3, backoff_ms=1, backoff_max_ms=8, ranura_ms=5):
+        """ crear_i2c(freq) devuelve un machine.I2C nuevo a esa frecuencia.
+        sda/scl son los machine.Pin del bus, necesarios para la
+        recuperación. Si se pasan `dispositivos`, se negocia la frecuencia. """
+        self._crear_i2c = crear_i2c
+        self.sda = sda
+        self.scl = scl
+        self.freq_max = freq_max
+        self.freq_min = freq_min
+        self.reintentos = reintentos
+        self.backoff_ms = backoff_ms
+        self.backoff_max_ms = backoff_max_ms
+        self.ranura_ms = ranura_ms
+        self.recuperaciones = 0
+        self.stats = {}
+        self._cerrojo = _thread.allocate_lock()
+        self._pendientes = []
+        self.freq = freq_min
+        self.i2c = crear_i2c(freq_min)
+        if dispositivos:
+            self.negociar_frecuencia(dispositivos)
+
+    # ---------- Frecuencia ----------
+    def negociar_frecuencia(self, dispositivos, sondeos=20):
+        """ Prueba de mayor a menor frecuencia: se queda con la primera en
+        la que todos los dispositivos responden a `sondeos` sondeos. """
+        with self._cerrojo:
+            for freq in self.FRECUENCIAS:
+                if freq > self.freq_max or freq < self.freq_min:
+                    continue
+                self.i2c = self._crear_i2c(freq)
+                try:
+                    encontrados = self.i2c.scan()
+                    if any(addr not in encontrados for addr in dispositivos):
+                        continue
+                    for _ in range(sondeos):
+                        for addr in dispositivos:
+                            self.i2c.writeto(addr, b'')
+                except OSError:
+                    continue
+                self.freq = freq
+                return freq
+            self.freq = self.freq_min
+            self.i2c = self._crear_i2c(self.freq_min)
+            return self.freq
+
+    # ---------- Recuperación ----------
+    def bus_atascado(self):
+        return self.sda is not None and self.sda.value() == 0
+
+    def recuperar(self):
+        """ Libera un esclavo que retiene SDA: hasta 9 pulsos en SCL y un
+        STOP, luego reinicia el periférico. True si SDA quedó libre. """
+        self.recuperaciones += 1
+        if self.sda is None or self.scl is None:
+            self.i2c = self._crear_i2c(self.freq)
+            return True
+        sda, scl = self.sda, self.scl
+        sda.init(sda.IN, sda.PULL_UP)
+        scl.init(scl.OPEN_DRAIN, value=1)
+        sleep_us(5)
+        for _ in range(9):
+            if sda.value():
+                break
+            scl.value(0)
+            sleep_us(5)
+            scl.value(1)
+            sleep_us(5)
+        # STOP: SDA baja con SCL en bajo (bajarla con SCL en alto sería un
+        # START) y sube mientras SCL está en alto
+        scl.value(0)
+        sleep_us(5)
+        sda.init(sda.OPEN_DRAIN, value=0)
+        sleep_us(5)
+        scl.value(1)
+        sleep_us(5)
+        sda.value(1)
+        sleep_us(5)
+        libre = sda.value() == 1
+        self.i2c = self._crear_i2c(self.freq)
+        return libre
+
+    # ---------- Ejecución ----------
+    def _stats(self, addr):
+        s = self.stats.get(addr)
+        if s is None:
+            s = self.stats[addr] = EstadisticasDispositivo()
+        return s
+
+    def _con_reintentos(self, addr, fn, *args):
+        """ Ejecuta fn(*args) con el cerrojo ya tomado """
+        s = self._stats(addr)
+        espera = self.backoff_ms
+        intento = 0
+        while True:
+            t0 = ticks_us()
+            try:
+                r = fn(*args)
+            except OSError:
+                s.errores += 1
+                if intento >= self.reintentos:
+                    raise
+                intento += 1
+                s.reintentos += 1
+                if intento >= 2 or self.bus_atascado():
+                    self.recuperar()
+                sleep_ms(espera)
+                espera = min(espera * 2, self.backoff_max_ms)
+                continue
+            lat = ticks_diff(ticks_us(), t0)
+            s.ok += 1
+            s.latencia_total_us += lat
+            if lat > s.latencia_max_us:
+                s.latencia_max_us = lat
+            return r
+
+    def _transaccion(self, addr, escritura, n, retardo_ms):
+        if escritura is not None:
+            self.i2c.writeto(addr, escritura)
+        if retardo_ms:
+            sleep_ms(retardo_ms)
+        if n:
+            return self.i2c.readfrom(addr, n)
+        return None
+
+    # ---------- API compatible con machine.I2C ----------
+    def scan(self):
+        with self._cerrojo:
+            return self.i2c.scan()
+
+    def writeto(self, addr, buf, stop=True):
+        with self._cerrojo:
+            return self._con_reintentos(addr, self._hw_writeto, addr, buf, stop)
+
+    def readfrom(self, addr, n, stop=True):
+        with self._cerrojo:
+            return self._con_reintentos(addr, self._hw_readfrom, addr, n, stop)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        with self._cerrojo:
+            return self._con_reintentos(addr, self._hw_readfrom_into, addr, buf, stop)
+
+    # El periférico cambia tras una recuperación: resolverlo en cada intento
+    def _hw_writeto(self, addr, buf, stop):
+        return self.i2c.writeto(addr, buf, stop)
+
+    def _hw_readfrom(self, addr, n, stop):
+        return self.i2c.readfrom(addr, n, stop)
+
+    def _hw_readfrom_into(self, addr, buf, stop):
+        return self.i2c.readfrom_into(addr, buf, stop)
+
+    def escribir_leer(self, addr, escritura, n, retardo_ms=0):
+        """ Escritura, espera y lectura sin que otro hilo se intercale """
+        with self._cerrojo:
+            return self._con_reintentos(addr, self._transaccion, addr, escritura, n, retardo_ms)
+
+    # ---------- Transacciones programadas ----------
+    def programar(self, addr, escritura=None, n=0, retardo_ms=0, en_ms=0, aviso=None):
+        """ Encola una transacción para dentro de `en_ms`. Si ya hay una
+        idéntica pendiente se fusiona con ella (se ejecuta una sola vez).
+        `aviso(transaccion)` se llama al terminar; el resultado también
+        queda en transaccion.resultado / transaccion.error. """
+        if escritura is not None:
+            escritura = bytes(escritura)
+        instante = ticks_add(ticks_ms(), en_ms)
+        with self._cerrojo:
+            for t in self._pendientes:
+                if t.igual(addr, escritura, n, retardo_ms):
+                    if ticks_diff(instante, t.instante) < 0:
+                        t.instante = instante
+                    break
+            else:
+                t = Transaccion(addr, escritura, n, retardo_ms, instante)
+                self._pendientes.append(t)
+            if aviso is not None:
+                t.avisos.append(aviso)
+        return t
+
+    def atender(self):
+        """ Ejecuta seguidas, con una sola toma del cerrojo, todas las
+        transacciones que vencen en la ranura actual. Llamar desde el
+        lazo de control. Devuelve cuántas se ejecutaron. """
+        limite = ticks_add(ticks_ms(), self.ranura_ms)
+        hechas = []
+        with self._cerrojo:
+            quedan = []
+            for t in self._pendientes:
+                if ticks_diff(t.instante, limite) <= 0:
+                    try:
+                        t.resultado = self._con_reintentos(t.addr, self._transaccion,
+                                                           t.addr, t.escritura, t.n, t.retardo_ms)
+                    except OSError as e:
+                        t.error = e
+                    t.hecho = True
+                    hechas.append(t)
+                else:
+                    quedan.append(t)
+            self._pendientes = quedan
+        # Avisos fuera del cerrojo: pueden programar nuevas transacciones
+        for t in hechas:
+            for aviso in t.avisos:
+                aviso(t)
+        return len(hechas)
+
+    def estadisticas(self):
+        return self.stats
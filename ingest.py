@@ -0,0 +1,360 @@
+# Ingesta de logs en un almacén columnar (sólo PC, requiere NumPy)
+# ------------------------------------------------------------
+# Convierte la salida de consola de muchos invernaderos en columnas
+# binarias por canal, una carpeta por invernadero:
+#   almacen/<invernadero>/t_ms.i8 temp.f4 rh.f4 lux.f4
+#                         suelo1.u2 suelo2.u2 suelo3.u2 bits.u1 meta.json
+# Cada archivo es un array plano que se abre con np.memmap sin cargarlo
+# en memoria. t_ms está ordenado, así que una consulta por rango de
+# tiempo es una búsqueda binaria sobre el propio archivo.
+#
+# La ingesta es incremental: meta.json guarda cuántas filas son
+# válidas y hasta qué byte se leyó cada log, de modo que volver a pasar
+# un log que sigue creciendo sólo añade las líneas nuevas. Si se corta
+# a mitad de una escritura, las filas sobrantes se descartan al abrir.
+# Cada log se reconoce además por una huella de sus primeros 4 KiB: si
+# se rota con el mismo nombre se relee desde el principio, y una copia
+# de un log ya ingerido sigue donde se quedó el original.
+#
+# Tiempo: t_ms es el reloj RTC del dispositivo (campo epoch_ms de la
+# línea TLM, ms desde 1970 UTC). El programa no lo pone en hora: lo hace
+# Thonny al conectar, o ntptime si se añade WiFi. Una línea sin reloj
+# válido toma el de la última línea con reloj del mismo arranque más
+# los ticks_ms transcurridos. Si en todo su arranque no hubo reloj
+# (formato antiguo, RTC sin poner) no tiene hora real: va aparte, a
+# almacen/<invernadero>/sin_reloj/, con t_ms = ticks_ms desenrollados
+# (tiempo de funcionamiento, no fecha), y no entra en las consultas
+# por fecha.
+#
+# Una fila con reloj que no avanza respecto a las ya guardadas es un
+# duplicado (reingesta, copia, solape) si ese instante ya está en el
+# almacén; si no lo está, es de un log más antiguo que lo ya ingerido
+# (atrasada) y se informa aparte: las columnas sólo crecen por el
+# final, así que para añadirla hay que ingerir los logs en orden.
+#
+#   python ingest.py ingerir almacen/ logs/inv07_*.log --invernadero inv07
+#   python ingest.py resumen almacen/ --desde 2026-05-01 --hasta 2026-06-01
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+import numpy as np
+from replay import Traza, desenrollar_ticks, parsear_tlm, reinicios
+
+CANALES = {
+    "t_ms": "<i8",
+    "temp": "<f4",
+    "rh": "<f4",
+    "lux": "<f4",
+    "suelo1": "<u2",
+    "suelo2": "<u2",
+    "suelo3": "<u2",
+    "bits": "<u1",
+}
+_EXTENSION = {"<i8": "i8", "<f4": "f4", "<u2": "u2", "<u1": "u1"}
+_BLOQUE = 1 << 20   # Filas por bloque al recorrer columnas largas
+_CABEZA = 4096      # Bytes del principio de un log que forman su huella
+_PASO_TELEMETRIA_MS = 5000  # TELEMETRIA_S del dispositivo: paso tras un reinicio sin otro previo
+_SIN_RELOJ = "sin_reloj"
+
+
+def epoch_ms(texto):
+    """ "2026-05-01" o "2026-05-01 12:00:00[.mmm]" (UTC) -> ms desde 1970 """
+    fecha = datetime.fromisoformat(texto)
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return int(round(fecha.timestamp() * 1000))
+
+
+_RELOJ_MINIMO = epoch_ms("2020-01-01")  # Antes, el RTC no se puso en hora
+
+
+def parsear_lineas(lineas):
+    """ Filas TLM de las líneas. Devuelve (ticks, relojes_ms, valores),
+    con NaN en relojes_ms cuando la línea no trae un reloj RTC válido y
+    valores de forma (n, 7): temp, rh, lux, suelo1..3, bits. """
+    ticks, epoch, temp, rh, lux, suelo, bits = parsear_tlm(lineas)
+    relojes = [e if e is not None and e >= _RELOJ_MINIMO else np.nan for e in epoch]
+    valores = np.column_stack((temp, rh, lux, np.reshape(suelo, (-1, 3)), bits)) if ticks else np.zeros((0, 7))
+    return np.asarray(ticks, dtype=np.int64), np.asarray(relojes, dtype=float), valores
+
+
+def tiempos(ticks, relojes, previo=None):
+    """ (t_ms, con_reloj, u) de cada fila. u son los ticks desenrollados,
+    que continúan los de `previo` (meta["ultimo"]: la última fila
+    ingerida). t_ms es el reloj RTC de la fila o, si no lo trae, el de
+    la última fila con reloj del mismo arranque más los ticks
+    transcurridos; con_reloj es False (y t_ms 0) si no hubo ninguna. """
+    paso = _PASO_TELEMETRIA_MS
+    if previo is not None:
+        ticks = np.concatenate(([previo["tick"]], ticks))
+        relojes = np.concatenate(([np.nan if previo["t_ms"] is None else previo["t_ms"]], relojes))
+        paso = previo["paso"]
+    if not len(ticks):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64)
+    # Un reinicio al empezar el log cuenta como el paso de la fila anterior
+    u = desenrollar_ticks(ticks, paso_inicial=paso)
+    if previo is not None:
+        u = u - u[0] + previo["u"]
+    _, reinicio = reinicios(ticks)
+    arranque = np.concatenate(([0], np.cumsum(reinicio)))
+    ancla = np.maximum.accumulate(np.where(~np.isnan(relojes), np.arange(len(u)), -1))
+    a = np.maximum(ancla, 0)
+    con_reloj = (ancla >= 0) & (arranque[a] == arranque)
+    t = np.where(con_reloj, relojes[a] + (u - u[a]), 0).astype(np.int64)
+    corte = slice(1, None) if previo is not None else slice(None)
+    return t[corte], con_reloj[corte], u[corte]
+
+
+class Invernadero:
+    """ Columnas de un invernadero abiertas como memmap de sólo lectura.
+    `filas` fija cuántas son válidas si no las lleva su propio meta.json. """
+
+    def __init__(self, carpeta, filas=None):
+        self.carpeta = carpeta
+        self.meta = _leer_meta(carpeta)
+        if filas is not None:
+            self.meta["filas"] = filas
+        n = self.meta["filas"]
+        self.columnas = {}
+        for canal, tipo in CANALES.items():
+            ruta = _ruta(carpeta, canal)
+            if n and os.path.exists(ruta):
+                self.columnas[canal] = np.memmap(ruta, dtype=tipo, mode="r", shape=(n,))
+            else:
+                self.columnas[canal] = np.zeros(0, dtype=tipo)
+
+    def __len__(self):
+        return self.meta["filas"]
+
+    def rango(self, desde_ms=None, hasta_ms=None):
+        """ slice de las filas con desde_ms <= t_ms < hasta_ms """
+        t = self.columnas["t_ms"]
+        i = 0 if desde_ms is None else int(np.searchsorted(t, desde_ms, side="left"))
+        j = len(t) if hasta_ms is None else int(np.searchsorted(t, hasta_ms, side="left"))
+        return slice(i, max(i, j))
+
+    def leer(self, desde_ms=None, hasta_ms=None, canales=None):
+        """ Vistas (sin copiar) de los canales pedidos en el rango """
+        tramo = self.rango(desde_ms, hasta_ms)
+        return {c: self.columnas[c][tramo] for c in (canales or CANALES)}
+
+    def traza(self, desde_ms=None, hasta_ms=None):
+        """ replay.Traza del rango, para reproducir la automatización """
+        c = self.leer(desde_ms, hasta_ms)
+        suelo = np.column_stack((c["suelo1"], c["suelo2"], c["suelo3"]))
+        return Traza(c["t_ms"], c["temp"], c["rh"], c["lux"], suelo, c["bits"])
+
+    def bloques(self, desde_ms=None, hasta_ms=None, canales=None, filas=_BLOQUE):
+        """ Recorre el rango por bloques de `filas` para agregar sin cargar todo """
+        tramo = self.rango(desde_ms, hasta_ms)
+        for i in range(tramo.start, tramo.stop, filas):
+            fin = min(tramo.stop, i + filas)
+            yield {c: self.columnas[c][i:fin] for c in (canales or CANALES)}
+
+
+class Almacen:
+    def __init__(self, raiz):
+        self.raiz = raiz
+        os.makedirs(raiz, exist_ok=True)
+
+    def invernaderos(self):
+        return sorted(d for d in os.listdir(self.raiz)
+                      if os.path.exists(os.path.join(self.raiz, d, "meta.json")))
+
+    def abrir(self, nombre, sin_reloj=False):
+        """ Filas con fecha o, con sin_reloj, las de arranques sin reloj RTC
+        (su t_ms es tiempo de funcionamiento) """
+        carpeta = os.path.join(self.raiz, nombre)
+        if not sin_reloj:
+            return Invernadero(carpeta)
+        return Invernadero(os.path.join(carpeta, _SIN_RELOJ), _leer_meta(carpeta)["filas_sin_reloj"])
+
+    def ingerir(self, nombre, ruta_log):
+        """ Añade las líneas TLM nuevas de `ruta_log`. Devuelve (filas
+        añadidas con fecha, filas añadidas sin reloj, duplicadas descartadas,
+        atrasadas descartadas). """
+        carpeta = os.path.join(self.raiz, nombre)
+        os.makedirs(carpeta, exist_ok=True)
+        meta = _leer_meta(carpeta)
+        fuente = os.path.abspath(ruta_log)
+        with open(ruta_log, "rb") as f:
+            cabeza = f.read(_CABEZA)
+            offset = _offset_previo(meta["fuentes"], fuente, cabeza, os.fstat(f.fileno()).st_size)
+            f.seek(offset)
+            datos = f.read()
+        completo = datos.rfind(b"\n") + 1  # Sólo líneas terminadas
+        lineas = datos[:completo].decode("utf-8", errors="replace").splitlines()
+        ticks, relojes, valores = parsear_lineas(lineas)
+
+        t, con_reloj, u = tiempos(ticks, relojes, meta["ultimo"])
+        if len(u):
+            paso = int(u[-1] - u[-2]) if len(u) > 1 else None
+            meta["ultimo"] = {"tick": int(ticks[-1]), "u": int(u[-1]),
+                              "t_ms": int(t[-1]) if con_reloj[-1] else None,
+                              "paso": paso or (meta["ultimo"] or {}).get("paso", _PASO_TELEMETRIA_MS)}
+
+        # Con reloj: sólo se añaden las que avanzan respecto a lo guardado
+        t_reloj, v_reloj = t[con_reloj], valores[con_reloj]
+        limite = np.iinfo(np.int64).min if meta["t_max"] is None else meta["t_max"]
+        nuevas = t_reloj > np.maximum.accumulate(np.concatenate(([limite], t_reloj[:-1])))
+        viejas = t_reloj[~nuevas]
+        repetidas = np.isin(viejas, t_reloj[nuevas])
+        if len(viejas) and meta["filas"]:
+            guardadas = np.memmap(_ruta(carpeta, "t_ms"), dtype=CANALES["t_ms"], mode="r",
+                                  shape=(meta["filas"],))
+            i = np.minimum(np.searchsorted(guardadas, viejas), meta["filas"] - 1)
+            repetidas |= np.asarray(guardadas[i]) == viejas
+            del guardadas
+        duplicadas = int(repetidas.sum())
+        atrasadas = len(viejas) - duplicadas
+        t_reloj, v_reloj = t_reloj[nuevas], v_reloj[nuevas]
+        if len(t_reloj):
+            _anexar(carpeta, meta["filas"], t_reloj, v_reloj)
+            meta["filas"] += len(t_reloj)
+            meta["t_max"] = int(t_reloj[-1])
+
+        # Sin reloj: aparte, con el tiempo de funcionamiento
+        u_sin, v_sin = u[~con_reloj], valores[~con_reloj]
+        if len(u_sin):
+            sub = os.path.join(carpeta, _SIN_RELOJ)
+            os.makedirs(sub, exist_ok=True)
+            _anexar(sub, meta["filas_sin_reloj"], u_sin, v_sin)
+            meta["filas_sin_reloj"] += len(u_sin)
+
+        meta["fuentes"][fuente] = {"offset": offset + completo, "cabeza": _huella(cabeza),
+                                   "bytes_cabeza": len(cabeza)}
+        _escribir_meta(carpeta, meta)  # Al final: las filas cuentan sólo si se escribió
+        return len(t_reloj), len(u_sin), duplicadas, atrasadas
+
+
+def _anexar(carpeta, n, t, valores):
+    """ Añade filas tras las `n` válidas de cada columna """
+    columnas = [t] + [valores[:, k] for k in range(7)]
+    for (canal, tipo), datos_canal in zip(CANALES.items(), columnas):
+        with open(_ruta(carpeta, canal), "ab") as f:
+            # Descarta filas de una escritura anterior interrumpida
+            f.truncate(n * np.dtype(tipo).itemsize)
+            np.asarray(datos_canal).astype(tipo).tofile(f)
+
+
+def _huella(datos):
+    return hashlib.sha1(datos).hexdigest()
+
+
+def _offset_previo(fuentes, fuente, cabeza, tam):
+    """ Byte hasta el que ya se leyó este log: el registrado para su
+    ruta o, si es una copia, para otro log con los mismos primeros
+    bytes. 0 si es nuevo, se truncó o se rotó con el mismo nombre. """
+    registros = [fuentes[fuente]] if fuente in fuentes else []
+    registros += [r for f, r in fuentes.items() if f != fuente]
+    for r in registros:
+        k = r["bytes_cabeza"]
+        if k and len(cabeza) >= k and tam >= r["offset"] and _huella(cabeza[:k]) == r["cabeza"]:
+            return r["offset"]
+    return 0
+
+
+def _ruta(carpeta, canal):
+    return os.path.join(carpeta, f"{canal}.{_EXTENSION[CANALES[canal]]}")
+
+
+def _leer_meta(carpeta):
+    ruta = os.path.join(carpeta, "meta.json")
+    if not os.path.exists(ruta):
+        return {"version": 2, "canales": CANALES, "filas": 0, "t_max": None,
+                "filas_sin_reloj": 0, "ultimo": None, "fuentes": {}}
+    with open(ruta, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["version"] < 2:
+        raise ValueError(f"{carpeta}: almacén de una versión anterior (tiempo sin reloj RTC); "
+                         f"vuelve a ingerir los logs en un almacén nuevo")
+    return meta
+
+
+def _escribir_meta(carpeta, meta):
+    # Escritura atómica: meta.json nunca queda a medias
+    tmp = os.path.join(carpeta, "meta.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, os.path.join(carpeta, "meta.json"))
+
+
+# ================== AGREGADOS ==================
+def resumen(invernadero, desde_ms=None, hasta_ms=None):
+    """ Media/mín/máx de temperatura y humedad y horas de cada actuador,
+    recorriendo el rango por bloques """
+    n, suma_t, suma_rh = 0, 0.0, 0.0
+    t_min, t_max = np.inf, -np.inf
+    horas = np.zeros(3)
+    previo = None
+    for b in invernadero.bloques(desde_ms, hasta_ms, ("t_ms", "temp", "rh", "bits")):
+        t = np.asarray(b["t_ms"])
+        temp = np.asarray(b["temp"], dtype=float)
+        n += len(t)
+        suma_t += temp.sum()
+        suma_rh += np.asarray(b["rh"], dtype=float).sum()
+        t_min, t_max = min(t_min, temp.min()), max(t_max, temp.max())
+        # Cada fila vale hasta la siguiente (la última del bloque enlaza con el próximo)
+        if previo is not None:
+            horas += ((previo[1] >> np.arange(3)) & 1) * (t[0] - previo[0])
+        dt = np.diff(t)
+        bits = np.asarray(b["bits"])[:-1, None]
+        horas += (((bits >> np.arange(3)) & 1) * dt[:, None]).sum(axis=0)
+        previo = (t[-1], int(b["bits"][-1]))
+    if not n:
+        return None
+    return {
+        "filas": n,
+        "temp_media": float(suma_t / n), "temp_min": float(t_min), "temp_max": float(t_max),
+        "rh_media": float(suma_rh / n),
+        "riego_h": float(horas[0]) / 3_600_000, "ferti_h": float(horas[1]) / 3_600_000,
+        "fan_h": float(horas[2]) / 3_600_000,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Almacén columnar de telemetría TLM")
+    sub = ap.add_subparsers(dest="orden", required=True)
+    ing = sub.add_parser("ingerir", help="Añade logs de consola al almacén")
+    ing.add_argument("almacen")
+    ing.add_argument("logs", nargs="+")
+    ing.add_argument("--invernadero", help="Nombre (por defecto, el del archivo sin extensión)")
+    res = sub.add_parser("resumen", help="Resumen por invernadero en un rango de fechas")
+    res.add_argument("almacen")
+    res.add_argument("--desde", help="Fecha ISO (UTC)")
+    res.add_argument("--hasta", help="Fecha ISO (UTC)")
+    args = ap.parse_args()
+
+    almacen = Almacen(args.almacen)
+    if args.orden == "ingerir":
+        for ruta in args.logs:
+            nombre = args.invernadero or os.path.splitext(os.path.basename(ruta))[0]
+            nuevas, sin_reloj, duplicadas, atrasadas = almacen.ingerir(nombre, ruta)
+            print(f"{nombre}: {ruta}: {nuevas} filas nuevas, {sin_reloj} sin reloj, "
+                  f"{duplicadas} duplicadas")
+            if sin_reloj:
+                print(f"  Aviso: {sin_reloj} filas de arranques sin reloj RTC; no entran en las "
+                      f"consultas por fecha (pon en hora el dispositivo)")
+            if atrasadas:
+                print(f"  Aviso: {atrasadas} filas anteriores a lo ya ingerido NO se han añadido; "
+                      f"ingiere los logs en orden cronológico en un almacén nuevo")
+        return
+    desde = epoch_ms(args.desde) if args.desde else None
+    hasta = epoch_ms(args.hasta) if args.hasta else None
+    for nombre in almacen.invernaderos():
+        sin_reloj = len(almacen.abrir(nombre, sin_reloj=True))
+        if sin_reloj:
+            print(f"{nombre}: {sin_reloj} filas sin reloj RTC (fuera de las fechas)")
+        r = resumen(almacen.abrir(nombre), desde, hasta)
+        if r is None:
+            print(f"{nombre}: sin datos en el rango")
+            continue
+        print(f"{nombre}: {r['filas']} filas, temp {r['temp_media']:.1f} C "
+              f"({r['temp_min']:.1f}..{r['temp_max']:.1f}), RH {r['rh_media']:.0f} %, "
+              f"riego {r['riego_h']:.1f} h, ferti {r['ferti_h']:.1f} h, ventilador {r['fan_h']:.1f} h")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# Modo de bajo consumo (instalaciones solares)
+# ------------------------------------------------------------
+# - Tras un tiempo sin toques apaga la pantalla ILI9341 (DISPOFF +
+#   SLPIN) y la retroiluminación; el siguiente toque la despierta.
+# - Entre ticks de automatización duerme en light-sleep hasta el
+#   plazo más próximo (fin de riego, próxima muestra...). Despierta
+#   por temporizador o por la línea IRQ del táctil; sin IRQ duerme a
+#   tramos de paso_ui_ms y sondea el panel entre uno y otro.
+# - Muestreo adaptativo: el intervalo de cada sensor se acorta cuando
+#   la lectura cambia deprisa y se alarga cuando está estable.
+# - Contabiliza tiempo despierto/dormido y estima el consumo medio.
+# El reloj y la función de dormir se inyectan para poder verificar
+# la planificación en simulación (ver sim.py).
+from compat import ticks_ms, ticks_diff, ticks_add, sleep_ms
+
+
+class MuestreoAdaptativo:
+    """ Decide cuándo toca leer un sensor. Con min_ms == max_ms == 0
+    toca siempre (comportamiento sin bajo consumo). """
+
+    def __init__(self, min_ms=0, max_ms=0, umbral=1.0):
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.umbral = umbral
+        self.intervalo_ms = min_ms
+        self.proximo = None
+        self._ultimo = None
+
+    def toca(self, ahora):
+        return self.proximo is None or ticks_diff(ahora, self.proximo) >= 0
+
+    def registrar(self, ahora, valor):
+        if self._ultimo is not None:
+            if abs(valor - self._ultimo) > self.umbral:
+                self.intervalo_ms = max(self.min_ms, self.intervalo_ms // 2)
+            else:
+                self.intervalo_ms = min(self.max_ms, self.intervalo_ms * 3 // 2 + 1)
+        self._ultimo = valor
+        self.proximo = ticks_add(ahora, self.intervalo_ms)
+
+
+class GestorEnergia:
+    # Consumos estimados (mA) para el informe; ajustar a la placa real
+    I_ACTIVO = 45.0        # ESP32-S3 despierto
+    I_LIGHT_SLEEP = 1.5    # ESP32-S3 en light-sleep con periféricos retenidos
+    I_PANTALLA = 70.0      # ILI9341 encendida con retroiluminación
+    I_PANTALLA_SLEEP = 0.1
+
+    def __init__(self, display, backlight=None, touch_irq=None, inactividad_ms=60000,
+                 paso_ui_ms=100, sueno_max_ms=30000, reloj=ticks_ms, dormir=None, esperar=sleep_ms):
+        """ dormir(ms) entra en light-sleep (por defecto machine.lightsleep);
+        esperar(ms) es la pausa normal con la pantalla encendida. """
+        self.display = display
+        self.backlight = backlight
+        self.inactividad_ms = inactividad_ms
+        self.paso_ui_ms = paso_ui_ms
+        self.sueno_max_ms = sueno_max_ms
+        self.reloj = reloj
+        self.esperar = esperar
+        if dormir is None:
+            import machine
+            dormir = machine.lightsleep
+        self.dormir = dormir
+        self.despierta_por_toque = False
+        if touch_irq is not None:
+            # El XPT2046 baja IRQ mientras se toca el panel
+            import esp32
+            esp32.wake_on_ext0(pin=touch_irq, level=esp32.WAKEUP_ALL_LOW)
+            self.despierta_por_toque = True
+        self.pantalla_encendida = True
+        ahora = reloj()
+        self._ultima_actividad = ahora
+        self._marca = ahora
+        self.ms_despierto = 0
+        self.ms_dormido = 0
+        self.ms_pantalla = 0
+        self.suspensiones = 0
+
+    # ---------- Pantalla ----------
+    def actividad(self):
+        """ Registrar un toque. True si sólo sirvió para despertar la pantalla. """
+        self._ultima_actividad = self.reloj()
+        if self.pantalla_encendida:
+            return False
+        self._contabilizar(False)
+        self.display.sleep(False)
+        self.esperar(5)  # SLPOUT necesita 5 ms antes del siguiente comando
+        self.display.display_on()
+        if self.backlight is not None:
+            self.backlight.value(1)
+        self.pantalla_encendida = True
+        return True
+
+    def revisar(self):
+        """ Apaga la pantalla si se superó el tiempo de inactividad """
+        ahora = self.reloj()
+        if self.pantalla_encendida and ticks_diff(ahora, self._ultima_actividad) >= self.inactividad_ms:
+            self._contabilizar(False)
+            if self.backlight is not None:
+                self.backlight.value(0)
+            self.display.display_off()
+            self.display.sleep(True)
+            self.pantalla_encendida = False
+
+    # ---------- Suspensión ----------
+    def dormir_hasta(self, plazos):
+        """ Espera hasta el plazo más próximo (ticks_ms) de `plazos`.
+        Sin IRQ táctil se limita a paso_ui_ms para seguir sondeando el
+        panel (con la pantalla encendida, sin light-sleep). Devuelve los
+        ms esperados. """
+        self.revisar()
+        ahora = self.reloj()
+        ms = self.sueno_max_ms
+        for p in plazos:
+            if p is not None:
+                ms = min(ms, ticks_diff(p, ahora))
+        if ms <= 0:
+            return 0
+        if not self.despierta_por_toque:
+            # Un toque sólo se detecta leyendo el panel: no pasar de paso_ui_ms
+            ms = min(ms, self.paso_ui_ms)
+            if self.pantalla_encendida:
+                self._contabilizar(False)
+                self.esperar(ms)
+                self._contabilizar(False)
+                return ms
+        self._contabilizar(False)
+        self.suspensiones += 1
+        self.dormir(ms)
+        self._contabilizar(True)
+        return ms
+
+    def _contabilizar(self, dormido):
+        """ Asigna el tiempo transcurrido desde la última marca """
+        ahora = self.reloj()
+        dt = ticks_diff(ahora, self._marca)
+        self._marca = ahora
+        if dt <= 0:
+            return
+        if dormido:
+            self.ms_dormido += dt
+        else:
+            self.ms_despierto += dt
+        if self.pantalla_encendida:
+            self.ms_pantalla += dt
+
+    # ---------- Informe ----------
+    def ciclo_trabajo(self):
+        total = self.ms_despierto + self.ms_dormido
+        return self.ms_despierto / total if total else 1.0
+
+    def corriente_media_ma(self):
+        total = self.ms_despierto + self.ms_dormido
+        if not total:
+            return 0.0
+        cpu = (self.ms_despierto * self.I_ACTIVO + self.ms_dormido * self.I_LIGHT_SLEEP) / total
+        pantalla = self.ms_pantalla / total
+        return cpu + pantalla * self.I_PANTALLA + (1 - pantalla) * self.I_PANTALLA_SLEEP
+
+    def informe(self):
+        self._contabilizar(False)
+        return (f"Ciclo de trabajo {self.ciclo_trabajo():.1%}, "
+                f"pantalla {self.ms_pantalla / max(1, self.ms_despierto + self.ms_dormido):.1%}, "
+                f"consumo estimado {self.corriente_media_ma():.1f} mA, "
+                f"{self.suspensiones} suspensiones")
@@ -0,0 +1,151 @@
+# Recuperación ante fallos: watchdog y arranque en caliente
+# ------------------------------------------------------------
+# El estado del controlador (actuadores, temporizadores de riego y
+# fertirriego, calibración táctil) se guarda en la memoria RTC en cada
+# transición. Esa memoria sobrevive a los reinicios por watchdog y por
+# software, así que al volver a arrancar se restaura en milisegundos y
+# el riego en curso termina a su hora en lugar de quedarse abierto o
+# cortarse.
+#
+# Los instantes se guardan como edades relativas al momento del
+# guardado (ticks_ms vuelve a 0 al reiniciar) junto con el segundo del
+# RTC, que sigue contando durante el reinicio.
+import struct
+import time
+from compat import ticks_ms, ticks_diff, ticks_add
+
+MAGIA = 0x494E5652  # "INVR"
+VERSION = 1
+# magia, versión, bits de actuadores, flags, segundo RTC,
+# edades (ms) de riego_inicio, riego_fin, ferti_inicio, calibración x4, suma
+_FORMATO = "<IBBHIiii4hH"
+_TAM = struct.calcsize(_FORMATO)
+# Edad máxima: el mayor ticks_diff positivo, y el mayor retroceso que
+# acepta ticks_add() en MicroPython (con más lanza OverflowError)
+_EDAD_MAX = (1 << 29) - 1
+
+F_RIEGO_ACTIVO = 1
+F_FERTI_ACTIVO = 2
+F_CALIBRADO = 4
+
+
+def _suma(datos):
+    """ Fletcher-16: detecta memoria RTC vacía o corrupta """
+    a = b = 0
+    for x in datos:
+        a = (a + x) % 255
+        b = (b + a) % 255
+    return (b << 8) | a
+
+
+def _edad(ahora, t):
+    """ ms desde el instante pasado `t`, saturada en _EDAD_MAX. Un instante
+    de hace más de medio periodo de ticks_ms (~6.2 días) da un ticks_diff
+    negativo: se trata como muy antiguo, no como recién ocurrido. """
+    d = ticks_diff(ahora, t)
+    return _EDAD_MAX if d < 0 else min(_EDAD_MAX, d)
+
+
+class EstadoControlador:
+    """ Lo necesario para retomar el control tras un reinicio """
+
+    def __init__(self):
+        self.actuadores = 0      # Bits encendidos: 1=riego, 2=ferti, 4=fan
+        self.riego_activo = False
+        self.ferti_activo = False
+        self.riego_inicio = 0    # ticks_ms
+        self.riego_fin = 0
+        self.ferti_inicio = 0
+        self.calibracion = None  # (x_min, x_max, y_min, y_max) o None
+
+
+class PuntoControl:
+    def __init__(self, memoria=None, reloj=ticks_ms, reloj_s=time.time):
+        """ memoria() devuelve los bytes guardados y memoria(datos) los
+        escribe (por defecto machine.RTC().memory). """
+        if memoria is None:
+            from machine import RTC
+            memoria = RTC().memory
+        self._memoria = memoria
+        self._reloj = reloj
+        self._reloj_s = reloj_s
+        self.guardados = 0
+
+    def guardar(self, estado):
+        ahora = self._reloj()
+        flags = ((F_RIEGO_ACTIVO if estado.riego_activo else 0)
+                 | (F_FERTI_ACTIVO if estado.ferti_activo else 0)
+                 | (F_CALIBRADO if estado.calibracion else 0))
+        cal = estado.calibracion or (0, 0, 0, 0)
+        datos = struct.pack(_FORMATO[:-1], MAGIA, VERSION, estado.actuadores, flags,
+                            int(self._reloj_s()), _edad(ahora, estado.riego_inicio),
+                            _edad(ahora, estado.riego_fin), _edad(ahora, estado.ferti_inicio), *cal)
+        datos += struct.pack("<H", _suma(datos))
+        self._memoria(datos)
+        self.guardados += 1
+
+    def cargar(self):
+        """ EstadoControlador con los instantes ya trasladados al reloj
+        actual, o None si no hay un punto de control válido. """
+        datos = self._memoria()
+        if len(datos) < _TAM:
+            return None
+        datos = bytes(datos[:_TAM])
+        campos = struct.unpack(_FORMATO, datos)
+        if campos[0] != MAGIA or campos[1] != VERSION or campos[-1] != _suma(datos[:-2]):
+            return None
+        _, _, bits, flags, segundo, e_riego_ini, e_riego_fin, e_ferti_ini = campos[:8]
+        # Tiempo fuera de servicio según el RTC (resolución de 1 s)
+        caido_ms = max(0, int(self._reloj_s()) - segundo) * 1000
+        ahora = self._reloj()
+        estado = EstadoControlador()
+        estado.actuadores = bits
+        estado.riego_activo = bool(flags & F_RIEGO_ACTIVO)
+        estado.ferti_activo = bool(flags & F_FERTI_ACTIVO)
+        # Saturar tras sumar la caída: ticks_add() no admite retrocesos mayores
+        estado.riego_inicio = ticks_add(ahora, -min(_EDAD_MAX, max(0, e_riego_ini) + caido_ms))
+        estado.riego_fin = ticks_add(ahora, -min(_EDAD_MAX, max(0, e_riego_fin) + caido_ms))
+        estado.ferti_inicio = ticks_add(ahora, -min(_EDAD_MAX, max(0, e_ferti_ini) + caido_ms))
+        if flags & F_CALIBRADO:
+            estado.calibracion = tuple(campos[8:12])
+        return estado
+
+    def borrar(self):
+        self._memoria(b'')
+
+
+def restaurar(punto_control, en_caliente, crear_salida, pines):
+    """ Arranque: devuelve (estado previo o None, salidas), con las
+    salidas de los actuadores ya creadas como estaban (activo bajo:
+    0 = encendido). crear_salida(pin, valor) crea cada una. Si el punto
+    de control no se puede leer, arranque en frío con todo apagado. """
+    estado = None
+    if en_caliente:
+        try:
+            estado = punto_control.cargar()
+        except Exception as e:
+            print(f"Punto de control ilegible, arranque en frío: {e}")
+    bits = estado.actuadores if estado is not None else 0
+    salidas = tuple(crear_salida(pin, 0 if bits >> i & 1 else 1) for i, pin in enumerate(pines))
+    return estado, salidas
+
+
+def arranque_en_caliente():
+    """ True si el reinicio conserva la memoria RTC (watchdog o software) """
+    import machine
+    return machine.reset_cause() in (machine.WDT_RESET, machine.SOFT_RESET)
+
+
+class Vigilante:
+    """ Watchdog hardware. Una vez iniciado no se puede parar: si el lazo
+    de control deja de alimentarlo durante `timeout_ms`, el chip se reinicia.
+    En el ESP32 sólo la tarea que lo crea puede alimentarlo (desde otro
+    hilo feed() lanza OSError). """
+
+    def __init__(self, timeout_ms=8000):
+        from machine import WDT
+        self.timeout_ms = timeout_ms
+        self._wdt = WDT(timeout=timeout_ms)
+
+    def alimentar(self):
+        self._wdt.feed()
@@ -0,0 +1,509 @@
+# Reproducción de trazas y barrido de parámetros de la automatización
+# ------------------------------------------------------------
+# (Sólo PC, requiere NumPy.) Lee las líneas de telemetría que imprime
+# el dispositivo (TLM,ticks_ms,epoch_ms,temp,rh,lux,s1,s2,s3,bits) y vuelve a
+# pasar por ellas la lógica de check_automation() con otros valores de
+# HUMEDAD_MINIMA_RIEGO, RIEGO_DURACION, RIEGO_INTERVALO y
+# TEMP_UMBRAL_FAN. Para cada combinación informa de:
+# - agua usada (tiempo de válvula abierta x caudal) y ciclos de válvula,
+# - tiempo fuera de banda: suelo por debajo de un mínimo agronómico
+#   sin una tanda de riegos en curso (válvula abierta o en la pausa
+#   entre riegos seguidos), y aire por encima de una temperatura máxima
+#   con el ventilador apagado,
+# - horas de ventilador.
+#
+# Modelo: cada muestra se mantiene hasta la siguiente (como la ve el
+# lazo de control) y la reproducción es en lazo abierto: el suelo
+# sigue la traza grabada aunque se riegue de otra forma. La regla de
+# VPD del ventilador no se reproduce.
+#
+# reproducir() recorre la traza muestra a muestra y sirve de
+# referencia. barrido() evalúa miles de combinaciones a la vez: en
+# lugar de recorrer muestras salta de tramo seco en tramo seco, y
+# dentro de cada tramo los riegos son periódicos y se suman en forma
+# cerrada. Tras una pausa húmeda larga el estado del control se
+# olvida, así que la traza se trocea ahí y todos los trozos de todas
+# las combinaciones avanzan juntos. El ventilador sólo depende del
+# umbral y sale de una suma acumulada sobre las temperaturas ordenadas.
+#
+#   python replay.py registro.log --humedad 0:60:2 --temp 28:40:0.5
+#   python replay.py --demo 180
+#   python replay.py --almacen almacen/ --invernadero inv07 --desde 2026-05-01
+import argparse
+import time
+import numpy as np
+
+PERIODO_TICKS = 1 << 30   # ticks_ms de MicroPython vuelve a 0 cada 2^30 ms
+PASO_CONTROL_MS = 100     # Tick del lazo de control en el dispositivo
+SUELO_SECO = 58000        # Igual que map_sensor() en el programa principal
+SUELO_MOJADO = 55000
+UMBRAL_DESCONECTADO = 59000
+SUELO_AUTOMATICO = 1      # El riego automático usa el sensor 2 (pin 5)
+
+
+class Traza:
+    """ Muestras ordenadas en el tiempo; suelo en crudo (ADC u16) """
+
+    def __init__(self, t_ms, temp, rh, lux, suelo, bits):
+        self.t_ms = np.asarray(t_ms, dtype=np.int64)
+        self.temp = np.asarray(temp, dtype=np.float32)
+        self.rh = np.asarray(rh, dtype=np.float32)
+        self.lux = np.asarray(lux, dtype=np.float32)
+        self.suelo = np.asarray(suelo, dtype=np.uint16).reshape(-1, 3)
+        self.bits = np.asarray(bits, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.t_ms)
+
+    def __getitem__(self, tramo):
+        """ Sub-traza: traza[i:j] """
+        return Traza(self.t_ms[tramo], self.temp[tramo], self.rh[tramo],
+                     self.lux[tramo], self.suelo[tramo], self.bits[tramo])
+
+    def duracion_ms(self):
+        return int(self.t_ms[-1] - self.t_ms[0]) if len(self) else 0
+
+    def humedad(self, canal=SUELO_AUTOMATICO):
+        return humedad_suelo(self.suelo[:, canal])
+
+
+def humedad_suelo(raw):
+    """ map_sensor() vectorizado, con 0 % para sensores desconectados """
+    raw = np.asarray(raw, dtype=np.int32)
+    pct = (100 * (SUELO_SECO - np.clip(raw, SUELO_MOJADO, SUELO_SECO))) // (SUELO_SECO - SUELO_MOJADO)
+    return np.where(raw > UMBRAL_DESCONECTADO, 0, pct).astype(np.int16)
+
+
+def reinicios(ticks, periodo=PERIODO_TICKS, salto_max_ms=3_600_000):
+    """ (pasos entre filas consecutivas, máscara de los que son un
+    reinicio): un salto hacia atrás que no cuadra con el desbordamiento """
+    d = np.diff(np.asarray(ticks, dtype=np.int64))
+    d = np.where(d < 0, d + periodo, d)
+    return d, d > salto_max_ms
+
+
+def desenrollar_ticks(ticks, periodo=PERIODO_TICKS, salto_max_ms=3_600_000, paso_inicial=0):
+    """ ticks_ms crudos -> ms monótonos. Un reinicio se cuenta como un
+    paso igual al anterior, o `paso_inicial` si aún no hubo ninguno. """
+    ticks = np.asarray(ticks, dtype=np.int64)
+    if len(ticks) < 2:
+        return ticks.copy()
+    d, reinicio = reinicios(ticks, periodo, salto_max_ms)
+    if reinicio.any():
+        paso = np.where(reinicio, 0, d)
+        # Paso anterior válido para cada reinicio
+        ultimo = np.maximum.accumulate(np.where(~reinicio, np.arange(len(d)), -1))
+        d = np.where(reinicio, np.where(ultimo >= 0, paso[np.maximum(ultimo, 0)], paso_inicial), d)
+    return np.concatenate(([ticks[0]], ticks[0] + np.cumsum(d)))
+
+
+def parsear_tlm(lineas):
+    """ Campos de las líneas TLM (pueden ir precedidas de texto, p. ej.
+    una marca de tiempo del PC). Devuelve (ticks, epoch_ms, temp, rh,
+    lux, suelo, bits); epoch_ms es None en las líneas del formato
+    antiguo, sin reloj RTC. """
+    ticks, epoch, temp, rh, lux, suelo, bits = [], [], [], [], [], [], []
+    for linea in lineas:
+        i = linea.find("TLM,")
+        if i < 0:
+            continue
+        campos = linea[i + 4:].strip().split(",")
+        if len(campos) == 8:
+            campos.insert(1, None)  # Formato antiguo
+        elif len(campos) != 9:
+            continue
+        try:
+            fila = (int(campos[0]), None if campos[1] is None else int(campos[1]),
+                    float(campos[2]), float(campos[3]), float(campos[4]),
+                    (int(campos[5]), int(campos[6]), int(campos[7])), int(campos[8]))
+        except ValueError:
+            continue  # Línea cortada o mezclada con otra salida
+        for lista, valor in zip((ticks, epoch, temp, rh, lux, suelo, bits), fila):
+            lista.append(valor)
+    return ticks, epoch, temp, rh, lux, suelo, bits
+
+
+def leer_log(*rutas):
+    """ Traza a partir de uno o varios logs de consola, en orden """
+    lineas = []
+    for ruta in rutas:
+        with open(ruta, encoding="utf-8", errors="replace") as f:
+            lineas.extend(f)
+    ticks, _, temp, rh, lux, suelo, bits = parsear_tlm(lineas)
+    return Traza(desenrollar_ticks(ticks), temp, rh, lux, suelo, bits)
+
+
+def traza_sintetica(dias=180, paso_s=5, semilla=1):
+    """ Temporada sintética: ciclos diarios de temperatura y luz, y un
+    suelo que se seca y se recupera en ciclos de varios días, con ruido """
+    rng = np.random.default_rng(semilla)
+    t = np.arange(0, dias * 86_400_000, paso_s * 1000, dtype=np.int64)
+    dia = t / 86_400_000
+    sol = np.clip(np.sin(2 * np.pi * (dia - 0.25)), 0, None)
+    temp = 22 + 6 * np.sin(2 * np.pi * dia / 365) + 9 * sol + rng.normal(0, 0.3, len(t))
+    rh = np.clip(80 - 30 * sol + rng.normal(0, 2, len(t)), 5, 100)
+    lux = 60000 * sol * rng.uniform(0.6, 1.0, len(t))
+    pct = 35 + 25 * np.sin(2 * np.pi * dia / 3.3) + 8 * np.sin(2 * np.pi * dia / 0.9)
+    suelo = np.empty((len(t), 3), dtype=np.uint16)
+    for i, desfase in enumerate((0.0, 0.0, 3.0)):
+        p = np.clip(pct + desfase + rng.normal(0, 1.0, len(t)), 0, 100)
+        suelo[:, i] = SUELO_SECO - p / 100 * (SUELO_SECO - SUELO_MOJADO)
+    return Traza(t, temp, rh, lux, suelo, np.zeros(len(t), dtype=np.uint8))
+
+
+# ================== REPRODUCCIÓN DE REFERENCIA ==================
+def reproducir(traza, humedad_minima, duracion_s, intervalo_s, temp_umbral,
+               suelo_min=30, temp_max=32.0, caudal_l_min=2.0):
+    """ Una combinación, muestra a muestra, con la misma lógica que
+    check_automation(). Lenta pero directa: sirve para validar barrido(). """
+    t = traza.t_ms - traza.t_ms[0]
+    h = traza.humedad()
+    temp = traza.temp
+    dur = int(duracion_s * 1000)
+    espera = int(intervalo_s * 1000) + PASO_CONTROL_MS  # ticks_diff(...) > intervalo
+    activo, en_tanda, humedo, inicio, permitido = False, False, False, 0, 0
+    abierto = riegos = fuera_suelo = pendiente = fan = fuera_temp = 0
+    for i in range(len(t) - 1):
+        a, b = int(t[i]), int(t[i + 1])
+        seco = h[i] <= humedad_minima
+        bajo = h[i] < suelo_min
+        if not seco:
+            humedo = True
+            if en_tanda:
+                # El suelo dejó de estar seco durante la pausa: la tanda terminó
+                fuera_suelo += pendiente
+                en_tanda = False
+        x = a
+        while x < b:
+            if activo:
+                y = min(inicio + dur, b)
+                abierto += y - x
+                if y == inicio + dur:
+                    # La tanda sigue si el suelo no ha dejado de estar seco
+                    activo, en_tanda, pendiente = False, not humedo, 0
+                    permitido = y + espera
+                x = y
+            elif seco and permitido < b:
+                y = max(x, permitido)
+                if bajo:
+                    if en_tanda:
+                        pendiente += y - x
+                    else:
+                        fuera_suelo += y - x
+                # Riego nuevo: la pausa de la tanda (si la había) no cuenta
+                activo, humedo, en_tanda, inicio = True, False, False, y
+                riegos += 1
+                x = y
+            else:
+                if bajo:
+                    if en_tanda:
+                        pendiente += b - x
+                    else:
+                        fuera_suelo += b - x
+                x = b
+        if temp[i] > temp_umbral:
+            fan += b - a
+        elif temp[i] > temp_max:
+            fuera_temp += b - a
+    if en_tanda:
+        fuera_suelo += pendiente
+    return {
+        "agua_l": abierto / 60_000 * caudal_l_min,
+        "riegos": riegos,
+        "suelo_fuera_h": fuera_suelo / 3_600_000,
+        "temp_fuera_h": fuera_temp / 3_600_000,
+        "fan_h": fan / 3_600_000,
+    }
+
+
+# ================== BARRIDO VECTORIZADO ==================
+_CORTE_MS = 600_000       # Pausas húmedas a partir de las que se trocea la traza
+_LOTE = 1_000_000         # Trozos simulados a la vez
+
+
+def _tramos(mascara, t):
+    """ Intervalos [inicio, fin) en que `mascara` (por muestra) es cierta,
+    manteniendo cada muestra hasta la siguiente """
+    m = np.concatenate(([False], mascara, [False]))
+    d = np.diff(m.astype(np.int8))
+    return t[np.flatnonzero(d == 1)], t[np.flatnonzero(d == -1)]
+
+
+class _Acumulada:
+    """ C(x) = tiempo de [0, x) dentro de los intervalos [u, v). Una tabla
+    sobre una rejilla uniforme deja cada evaluación en O(1). """
+
+    def __init__(self, u, v, fin, paso):
+        self.nudos = np.empty(2 * len(u) + 1, dtype=np.int64)
+        self.nudos[0] = -1
+        self.nudos[1::2] = u
+        self.nudos[2::2] = v
+        self.valor = np.zeros(len(self.nudos))
+        self.valor[2::2] = np.cumsum(v - u)
+        self.valor[1::2] = self.valor[2::2] - (v - u)
+        self.paso = max(1, int(paso))
+        rejilla = np.arange(0, fin + self.paso + 1, self.paso)
+        self.tabla = np.searchsorted(self.nudos, rejilla, side="right") - 1
+        self.nudos = np.append(self.nudos, np.iinfo(np.int64).max)
+
+    def __call__(self, x):
+        i = self.tabla[x // self.paso]
+        while True:
+            avanza = self.nudos[i + 1] <= x
+            if not avanza.any():
+                break
+            i = i + avanza
+        # Índice impar: x está dentro de un intervalo que empieza en nudos[i]
+        return self.valor[i] + (i & 1) * (x - self.nudos[i])
+
+
+def _simular_trozos(a_tr, clave_b, base, ids, j, tope, p, d, fin, acumulada, cuentas):
+    """ Avanza a la vez todos los trozos, un tramo seco por paso. En cada
+    tramo los riegos empiezan en s, s+p, s+2p... mientras siga seco. """
+    abierto, riegos, tanda = cuentas
+    tau = a_tr[j]                              # Primer instante en que se permite regar
+    while len(ids):
+        clave = base + tau
+        # El siguiente tramo que acaba después de tau suele estar muy cerca
+        for _ in range(3):
+            j = j + (clave_b[j] <= clave)
+        lejos = clave_b[j] <= clave
+        if lejos.any():
+            j[lejos] = np.searchsorted(clave_b, clave[lejos], side="right")
+        ok = j < tope
+        if not ok.all():
+            ids, j, tope, p, d, base, tau = (x[ok] for x in (ids, j, tope, p, d, base, tau))
+        s = np.maximum(tau, a_tr[j])
+        n = (clave_b[j] - base - s + p - 1) // p
+        ultimo = s + (n - 1) * p
+        abierto[ids] += n * d - np.maximum(0, ultimo + d - fin)
+        riegos[ids] += n
+        tanda[ids] += acumulada(np.minimum(ultimo + d, fin)) - acumulada(s)
+        tau = s + n * p
+        j = j + 1
+        ok = (j < tope) & (tau < fin)
+        ids, j, tope, p, d, base, tau = (x[ok] for x in (ids, j, tope, p, d, base, tau))
+
+
+def _barrido_riego(t, h, humedades, dur, per, acumulada):
+    """ Métricas de riego para cada combinación (índice de humedad, duración
+    ms, periodo ms). Devuelve (ms abiertos, riegos, ms por debajo del
+    mínimo de suelo dentro de una tanda de riegos). """
+    fin = int(t[-1])
+    span = fin + 1
+    n_comb = len(dur)
+    por_h = n_comb // len(humedades)
+
+    # Tramos secos de cada umbral, en una sola tabla con clave h*span + fin
+    a_tr, clave_b, limites = [], [], [0]
+    for k, hum in enumerate(humedades):
+        a, b = _tramos(h[:-1] <= hum, t)
+        a_tr.append(a)
+        clave_b.append(k * span + b)
+        limites.append(limites[-1] + len(a))
+    a_tr = np.concatenate(a_tr + [[fin]])
+    clave_b = np.concatenate(clave_b + [[np.iinfo(np.int64).max]])
+
+    # Trozos: tras una pausa húmeda de al menos max(periodo, _CORTE_MS) el
+    # estado del control se olvida (se vuelve a poder regar antes de que
+    # empiece el siguiente tramo), así que cada trozo se simula aparte
+    trozos = []
+    for k in range(len(humedades)):
+        lo, hi = limites[k], limites[k + 1]
+        if lo == hi:
+            continue
+        combos = np.arange(k * por_h, (k + 1) * por_h)
+        pausa = a_tr[lo + 1:hi] - (clave_b[lo:hi - 1] - k * span)
+        corte = np.concatenate((np.ones((por_h, 1), dtype=bool),
+                                pausa[None, :] >= np.maximum(per[combos], _CORTE_MS)[:, None]), axis=1)
+        fila, r = np.nonzero(corte)
+        tope = np.append(r[1:], hi - lo)
+        tope[np.append(fila[1:] != fila[:-1], True)] = hi - lo
+        trozos.append((combos[fila], lo + r, lo + tope, k * span))
+
+    cuentas = (np.zeros(n_comb, dtype=np.int64), np.zeros(n_comb, dtype=np.int64), np.zeros(n_comb))
+    lote = []
+    for i, trozo in enumerate(trozos):
+        lote.append(trozo)
+        if i == len(trozos) - 1 or sum(len(x[0]) for x in lote) >= _LOTE:
+            c = np.concatenate([x[0] for x in lote])
+            j = np.concatenate([x[1] for x in lote])
+            tope = np.concatenate([x[2] for x in lote])
+            base = np.concatenate([np.full(len(x[0]), x[3], dtype=np.int64) for x in lote])
+            # Acumuladores por trozo: un mismo combo aparece en varios trozos
+            parcial = (np.zeros(len(c), dtype=np.int64), np.zeros(len(c), dtype=np.int64), np.zeros(len(c)))
+            _simular_trozos(a_tr, clave_b, base, np.arange(len(c)), j, tope,
+                            per[c], dur[c], fin, acumulada, parcial)
+            for total, x in zip(cuentas, parcial):
+                total += np.bincount(c, weights=x, minlength=n_comb).astype(total.dtype)
+            lote = []
+    return cuentas
+
+
+def _suma_por_encima(valores, pesos):
+    """ f(x) = suma de pesos con valor > x, para x vectorial """
+    orden = np.argsort(valores, kind="stable")
+    v = valores[orden]
+    acum = np.concatenate((np.cumsum(pesos[orden][::-1])[::-1], [0]))
+    return lambda x: acum[np.searchsorted(v, x, side="right")]
+
+
+def barrido(traza, humedades, duraciones_s, intervalos_s, umbrales_temp,
+            suelo_min=30, temp_max=32.0, caudal_l_min=2.0):
+    """ Todas las combinaciones de los cuatro parámetros. Devuelve un
+    dict de arrays con forma (humedades, duraciones, intervalos, umbrales). """
+    humedades = np.asarray(humedades)
+    duraciones_s = np.asarray(duraciones_s, dtype=float)
+    intervalos_s = np.asarray(intervalos_s, dtype=float)
+    umbrales_temp = np.asarray(umbrales_temp, dtype=float)
+    t = traza.t_ms - traza.t_ms[0]
+    h = traza.humedad()
+    dt = np.diff(t).astype(float)
+
+    # Riego: una fila por (humedad, duración, intervalo)
+    H, D, I = np.meshgrid(humedades, duraciones_s, intervalos_s, indexing="ij")
+    dur = np.round(D.ravel() * 1000).astype(np.int64)
+    per = dur + np.round(I.ravel() * 1000).astype(np.int64) + PASO_CONTROL_MS
+    bajo_u, bajo_v = _tramos(h[:-1] < suelo_min, t)
+    acumulada = _Acumulada(bajo_u, bajo_v, int(t[-1]), np.median(dt) if len(dt) else 1)
+    abierto, riegos, en_tanda = _barrido_riego(t, h, humedades, dur, per, acumulada)
+    forma = H.shape + (1,)
+    suelo_fuera = (bajo_v - bajo_u).sum() - en_tanda
+
+    # Ventilador: sólo depende del umbral
+    por_encima = _suma_por_encima(traza.temp[:-1], dt)
+    fan = por_encima(umbrales_temp)
+    temp_fuera = por_encima(temp_max) - por_encima(np.maximum(umbrales_temp, temp_max))
+
+    completa = H.shape + (len(umbrales_temp),)
+    rejilla = np.meshgrid(humedades, duraciones_s, intervalos_s, umbrales_temp, indexing="ij")
+
+    def riego(v):
+        return np.broadcast_to(v.reshape(forma), completa)
+
+    def ventilador(v):
+        return np.broadcast_to(np.asarray(v, dtype=float), completa)
+
+    return {
+        "humedad_minima": rejilla[0],
+        "duracion_s": rejilla[1],
+        "intervalo_s": rejilla[2],
+        "temp_umbral": rejilla[3],
+        "agua_l": riego(abierto / 60_000 * caudal_l_min),
+        "riegos": riego(riegos),
+        "suelo_fuera_h": riego(suelo_fuera / 3_600_000),
+        "temp_fuera_h": ventilador(temp_fuera / 3_600_000),
+        "fan_h": ventilador(fan / 3_600_000),
+    }
+
+
+# ================== INFORME ==================
+COLUMNAS = ("humedad_minima", "duracion_s", "intervalo_s", "temp_umbral",
+            "agua_l", "riegos", "suelo_fuera_h", "temp_fuera_h", "fan_h")
+
+
+def mejores(resultado, n=10, peso_agua=0.01, peso_ciclos=0.001, peso_fan=0.01):
+    """ Índices planos de las n combinaciones de menor coste: horas
+    fuera de banda más penalizaciones por agua, ciclos y ventilador """
+    coste = (resultado["suelo_fuera_h"] + resultado["temp_fuera_h"]
+             + peso_agua * resultado["agua_l"] + peso_ciclos * resultado["riegos"]
+             + peso_fan * resultado["fan_h"]).ravel()
+    n = min(n, len(coste))
+    return np.argsort(coste, kind="stable")[:n]
+
+
+def imprimir(resultado, indices):
+    print(" ".join(f"{c:>14}" for c in COLUMNAS))
+    for i in indices:
+        print(" ".join(f"{float(resultado[c].flat[i]):14.2f}" for c in COLUMNAS))
+
+
+def guardar_csv(resultado, ruta):
+    columnas = np.column_stack([np.asarray(resultado[c], dtype=float).ravel() for c in COLUMNAS])
+    np.savetxt(ruta, columnas, delimiter=",", header=",".join(COLUMNAS), comments="", fmt="%.4g")
+
+
+def _rango(texto):
+    """ "a:b:paso" (b incluido) o lista "a,b,c" """
+    if ":" in texto:
+        a, b, paso = (float(x) for x in texto.split(":"))
+        return np.arange(a, b + paso / 2, paso)
+    return np.array([float(x) for x in texto.split(",")])
+
+
+def demo(dias):
+    traza = traza_sintetica(dias)
+    print(f"Traza sintética: {dias} días, {len(traza)} muestras")
+    parametros = dict(humedades=np.arange(0, 62, 2), duraciones_s=np.arange(2, 32, 3),
+                      intervalos_s=np.array([5, 10, 30, 60, 120, 300, 600, 1800]),
+                      umbrales_temp=np.arange(26, 40.5, 0.5))
+    t0 = time.perf_counter()
+    res = barrido(traza, **parametros)
+    segundos = time.perf_counter() - t0
+    print(f"Barrido: {res['agua_l'].size} combinaciones en {segundos:.2f} s")
+    imprimir(res, mejores(res))
+
+    # Comprobación contra la reproducción muestra a muestra (primera semana)
+    semana = traza[:int(np.searchsorted(traza.t_ms, traza.t_ms[0] + 7 * 86_400_000))]
+    rng = np.random.default_rng(0)
+    for i in rng.choice(res["agua_l"].size, 5, replace=False):
+        args = [float(res[c].flat[i]) for c in COLUMNAS[:4]]
+        ref = reproducir(semana, *args)
+        vec = barrido(semana, *([x] for x in args))
+        dif = max(abs(ref[c] - float(vec[c].flat[0])) for c in ref)
+        print(f"  referencia {args}: diferencia máxima {dif:.2e}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Reproduce trazas TLM y barre parámetros de automatización")
+    ap.add_argument("logs", nargs="*", help="Logs de consola con líneas TLM")
+    ap.add_argument("--humedad", default="0:60:2", help="HUMEDAD_MINIMA_RIEGO (%%)")
+    ap.add_argument("--duracion", default="2:30:2", help="RIEGO_DURACION (s)")
+    ap.add_argument("--intervalo", default="5,10,30,60,120,300,600", help="RIEGO_INTERVALO (s)")
+    ap.add_argument("--temp", default="28:40:0.5", help="TEMP_UMBRAL_FAN (C)")
+    ap.add_argument("--suelo-min", type=float, default=30, help="Humedad mínima agronómica (%%)")
+    ap.add_argument("--temp-max", type=float, default=32.0, help="Temperatura máxima agronómica (C)")
+    ap.add_argument("--caudal", type=float, default=2.0, help="Caudal de la válvula (L/min)")
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--peso-agua", type=float, default=0.01, help="Horas fuera de banda que equivalen a 1 L")
+    ap.add_argument("--peso-ciclos", type=float, default=0.001, help="Horas fuera de banda que equivalen a un ciclo")
+    ap.add_argument("--peso-fan", type=float, default=0.01, help="Horas fuera de banda que equivalen a 1 h de ventilador")
+    ap.add_argument("--csv", help="Guardar todas las combinaciones en CSV")
+    ap.add_argument("--demo", type=int, metavar="DIAS", help="Usar una temporada sintética")
+    ap.add_argument("--almacen", help="Leer la traza de un almacén de ingest.py en lugar de logs")
+    ap.add_argument("--invernadero", help="Invernadero del almacén")
+    ap.add_argument("--desde", help="Fecha ISO (UTC) de inicio en el almacén")
+    ap.add_argument("--hasta", help="Fecha ISO (UTC) de fin en el almacén")
+    ap.add_argument("--sin-reloj", action="store_true",
+                    help="Usar las filas del almacén de arranques sin reloj RTC (sin fechas)")
+    args = ap.parse_args()
+
+    if args.demo:
+        demo(args.demo)
+        return
+    if args.almacen:
+        from ingest import Almacen, epoch_ms
+        if not args.invernadero:
+            ap.error("--almacen necesita --invernadero")
+        if args.sin_reloj and (args.desde or args.hasta):
+            ap.error("las filas sin reloj no tienen fecha: --sin-reloj no admite --desde/--hasta")
+        traza = Almacen(args.almacen).abrir(args.invernadero, sin_reloj=args.sin_reloj).traza(
+            epoch_ms(args.desde) if args.desde else None, epoch_ms(args.hasta) if args.hasta else None)
+    elif args.logs:
+        traza = leer_log(*args.logs)
+    else:
+        ap.error("indica al menos un log, --almacen o --demo")
+    if len(traza) < 2:
+        ap.error("no hay líneas TLM en los logs")
+    print(f"{len(traza)} muestras, {traza.duracion_ms() / 86_400_000:.1f} días")
+    t0 = time.perf_counter()
+    res = barrido(traza, _rango(args.humedad), _rango(args.duracion), _rango(args.intervalo),
+                  _rango(args.temp), args.suelo_min, args.temp_max, args.caudal)
+    print(f"{res['agua_l'].size} combinaciones en {time.perf_counter() - t0:.2f} s")
+    imprimir(res, mejores(res, args.top, args.peso_agua, args.peso_ciclos, args.peso_fan))
+    if args.csv:
+        guardar_csv(res, args.csv)
+
+
+if __name__ == "__main__":
+    main()
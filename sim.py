@@ -0,0 +1,500 @@
+# Simulación en el PC de los periféricos del invernadero
+# ------------------------------------------------------------
+# Bus I2C y dispositivos falsos con el mismo comportamiento que los
+# reales (tiempos de conversión, apagado tras medidas únicas,
+# saturación), para ejercitar los drivers sin hardware:
+#   python sim.py
+from compat import ticks_ms, ticks_diff
+
+
+class FakeI2C:
+    """ Bus I2C simulado: despacha las transacciones por dirección.
+    Un dispositivo que no responde provoca OSError(ENODEV) como en
+    machine.I2C. Además puede:
+    - fallar una de cada `fallo_cada` transacciones por encima de
+      `freq_max_estable` (cableado largo, pull-ups débiles);
+    - quedar con SDA atascada hasta recibir `atasco` pulsos en SCL. """
+
+    def __init__(self, freq=100000, freq_max_estable=400000, fallo_cada=3):
+        self.freq = freq
+        self.freq_max_estable = freq_max_estable
+        self.fallo_cada = fallo_cada
+        self.dispositivos = {}
+        self.transacciones = 0
+        self.atasco = 0
+        self.condiciones = []  # "START"/"STOP" vistos en las líneas
+        self.sda = FakePin(self, "sda")
+        self.scl = FakePin(self, "scl")
+
+    def crear(self, freq):
+        """ Equivalente a construir machine.I2C(..., freq=freq) """
+        self.freq = freq
+        return self
+
+    def agregar(self, dispositivo):
+        self.dispositivos[dispositivo.addr] = dispositivo
+        return dispositivo
+
+    def atascar(self, pulsos=5):
+        """ Un esclavo retiene SDA en bajo a mitad de un byte """
+        self.atasco = pulsos
+
+    def _dispositivo(self, addr):
+        self.transacciones += 1
+        if self.atasco:
+            raise OSError(116)  # ETIMEDOUT: el bus no queda libre
+        if self.freq > self.freq_max_estable and self.transacciones % self.fallo_cada == 0:
+            raise OSError(5)    # EIO: bit corrupto / NACK espurio
+        dev = self.dispositivos.get(addr)
+        if dev is None:
+            raise OSError(19)  # ENODEV: sin ACK de dirección
+        return dev
+
+    def scan(self):
+        return [] if self.atasco else sorted(self.dispositivos)
+
+    def writeto(self, addr, buf, stop=True):
+        self._dispositivo(addr).escribir(bytes(buf))
+        return len(buf)
+
+    def readfrom(self, addr, n, stop=True):
+        return bytes(self._dispositivo(addr).leer(n))
+
+    def readfrom_into(self, addr, buf, stop=True):
+        datos = self._dispositivo(addr).leer(len(buf))
+        for i in range(len(buf)):
+            buf[i] = datos[i]
+
+
+class FakePin:
+    """ Pin SDA/SCL del bus simulado (interfaz de machine.Pin) """
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 1
+
+    def __init__(self, bus, nombre):
+        self.bus = bus
+        self.nombre = nombre
+        self._valor = 1
+
+    def init(self, mode=None, pull=None, value=None):
+        if value is not None:
+            self.value(value)
+
+    def value(self, v=None):
+        if v is None:
+            if self.nombre == "sda" and self.bus.atasco:
+                return 0
+            return self._valor
+        if self.nombre == "scl" and v and not self._valor and self.bus.atasco:
+            self.bus.atasco -= 1  # Flanco de subida: el esclavo avanza un bit
+        if self.nombre == "sda" and self.bus.scl._valor and (1 if v else 0) != self._valor:
+            # SDA cambia con SCL en alto: condición de START (baja) o STOP (sube)
+            self.bus.condiciones.append("STOP" if v else "START")
+        self._valor = 1 if v else 0
+
+
+def crc8_sensirion(datos):
+    crc = 0xFF
+    for b in datos:
+        crc ^= b
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+class FakeSHT30:
+    """ Modelo del SHT30 en modo de medida única (0x2C06) """
+
+    def __init__(self, temp, rh, addr=0x44):
+        self.addr = addr
+        self.temp = temp
+        self.rh = rh
+        self._medida = None
+
+    def escribir(self, datos):
+        if len(datos) == 0:
+            return  # Sondeo de dirección
+        if bytes(datos) != b'\x2C\x06':
+            raise OSError(5)
+        t_raw = int((self.temp() + 45) / 175 * 65535)
+        rh_raw = int(self.rh() / 100 * 65535)
+        t = bytes([t_raw >> 8, t_raw & 0xFF])
+        h = bytes([rh_raw >> 8, rh_raw & 0xFF])
+        self._medida = t + bytes([crc8_sensirion(t)]) + h + bytes([crc8_sensirion(h)])
+
+    def leer(self, n):
+        if self._medida is None:
+            raise OSError(19)  # Sin medida: el sensor no reconoce la lectura
+        datos, self._medida = self._medida, None
+        return datos[:n]
+
+
+class FakeBH1750:
+    """ Modelo del BH1750: registro de 16 bits, MTreg, modos continuos
+    y de una sola medida con su tiempo de conversión típico. `lux()`
+    devuelve la iluminación real en cada instante. """
+
+    def __init__(self, lux, addr=0x23, reloj=ticks_ms):
+        self.addr = addr
+        self.lux = lux
+        self.reloj = reloj
+        self.encendido = False
+        self.modo = None
+        self.mtreg = 69
+        self.registro = 0
+        self._inicio = None
+
+    def _duracion(self):
+        base = 16 if (self.modo & 0x03) == 0x03 else 120
+        return base * self.mtreg // 69
+
+    def _cuenta(self):
+        cuenta = self.lux() * 1.2 * self.mtreg / 69
+        res = self.modo & 0x03
+        if res == 0x01:
+            cuenta *= 2
+        elif res == 0x03:
+            cuenta = int(cuenta) // 4 * 4
+        return min(0xFFFF, int(cuenta))
+
+    def _actualizar(self):
+        if self._inicio is None:
+            return
+        transcurrido = ticks_diff(self.reloj(), self._inicio)
+        if transcurrido < self._duracion():
+            return
+        self.registro = self._cuenta()
+        if self.modo & 0x10:
+            self._inicio = self.reloj()
+        else:
+            self._inicio = None
+            self.encendido = False  # Medida única: se apaga sola
+
+    def escribir(self, datos):
+        for cmd in datos:  # Un sondeo de dirección no trae bytes
+            if cmd == 0x00:
+                self.encendido = False
+                self._inicio = None
+            elif cmd == 0x01:
+                self.encendido = True
+            elif cmd == 0x07:
+                if self.encendido:
+                    self.registro = 0
+            elif cmd & 0xF8 == 0x40:
+                self.mtreg = (self.mtreg & 0x1F) | ((cmd & 0x07) << 5)
+            elif cmd & 0xE0 == 0x60:
+                self.mtreg = (self.mtreg & 0xE0) | (cmd & 0x1F)
+            elif cmd in (0x10, 0x11, 0x13, 0x20, 0x21, 0x23):
+                if not self.encendido:
+                    raise OSError(5)  # EIO: comando ignorado apagado
+                self.modo = cmd
+                self._inicio = self.reloj()
+            else:
+                raise OSError(5)
+
+    def leer(self, n):
+        self._actualizar()
+        return bytes([self.registro >> 8, self.registro & 0xFF])[:n]
+
+
+class RelojVirtual:
+    """ Reloj en ms que sólo avanza cuando se le pide: dormir 1 h cuesta nada """
+
+    def __init__(self):
+        self.t = 0
+
+    def ahora(self):
+        return self.t
+
+    def avanzar(self, ms):
+        self.t += int(ms)
+
+
+class FakeRTCMemoria:
+    """ machine.RTC().memory: sobrevive a los reinicios que se simulen """
+
+    def __init__(self):
+        self.datos = b''
+
+    def __call__(self, datos=None):
+        if datos is None:
+            return self.datos
+        self.datos = bytes(datos)
+
+
+class FakeDisplay:
+    """ Lo mínimo de ili9341.Display que usa el gestor de energía """
+
+    def __init__(self):
+        self.dormida = False
+        self.encendida = True
+
+    def sleep(self, enable=True):
+        self.dormida = enable
+
+    def display_on(self):
+        self.encendida = True
+
+    def display_off(self):
+        self.encendida = False
+
+
+# ================== ESCENARIOS ==================
+def escenario_bh1750():
+    """ Barrido de 0.5 lx a 120 klx con medidas únicas y autorrango: el
+    error no pasa del 1 % o de una cuenta del rango elegido. Después,
+    el camino no bloqueante start/poll/fetch. """
+    from bh1750 import BH1750
+    from compat import sleep_ms
+    nivel = [0.0]
+    i2c = FakeI2C()
+    i2c.agregar(FakeBH1750(lambda: nivel[0]))
+    t0 = ticks_ms()
+    sensor = BH1750(i2c, mode=BH1750.ONE_TIME_HIGH_RES)
+    init_ms = ticks_diff(ticks_ms(), t0)
+    print(f"BH1750: init en {init_ms} ms")
+    assert init_ms < 20, "el constructor no debe esperar a la conversión"
+    peor = 0.0
+    for real in (0.5, 5, 50, 500, 5000, 50000, 120000):
+        nivel[0] = real
+        for _ in range(3):  # Deja converger el autorrango
+            lux = sensor.read_lux()
+        error = abs(lux - real) / real
+        peor = max(peor, error)
+        # Una cuenta cruda en lux con el MTreg y la resolución de la lectura
+        cuenta = 1 / 1.2 * BH1750.MTREG_DEFAULT / sensor.mtreg / (2 if sensor.mode & 0x03 == 0x01 else 1)
+        print(f"  real {real:>9} lx -> {lux:>10.2f} lx  MTreg={sensor.mtreg:<3} modo=0x{sensor.mode:02X} err={error:.1%}")
+        assert not sensor.saturado and abs(lux - real) <= max(0.01 * real, cuenta), real
+
+    # No bloqueante: start() vuelve enseguida y poll() avisa al terminar
+    nivel[0] = 800.0
+    for _ in range(2):  # La segunda vez, con el sensor ya apagado por la medida única
+        t0 = ticks_ms()
+        sensor.start()
+        assert ticks_diff(ticks_ms(), t0) < 20 and not sensor.poll() and sensor.fetch() is None
+        esperas = 0
+        while not sensor.poll():
+            sleep_ms(10)
+            esperas += 1
+            assert esperas * 10 <= sensor.conversion_ms() + 50, "la conversión no termina"
+        lux = sensor.fetch()
+        assert abs(lux - 800.0) <= 8.0 and not sensor.midiendo() and not sensor.poll()
+    print(f"  start/poll/fetch: {lux:.1f} lx tras {esperas} sondeos, sin conversión en curso tras leer")
+    return peor
+
+
+def escenario_bus():
+    """ Negociación de frecuencia, bus atascado y fusión de lecturas """
+    from i2c_bus import BusI2C
+    i2c = FakeI2C(freq_max_estable=200000)
+    i2c.agregar(FakeSHT30(lambda: 25.0, lambda: 60.0))
+    i2c.agregar(FakeBH1750(lambda: 800.0))
+    bus = BusI2C(i2c.crear, sda=i2c.sda, scl=i2c.scl, dispositivos=(0x44, 0x23))
+    print(f"Bus: frecuencia negociada {bus.freq // 1000} kHz")
+
+    i2c.atascar(5)
+    datos = bus.escribir_leer(0x44, b'\x2C\x06', 6, retardo_ms=15)
+    print(f"  SDA atascada: lectura SHT30 correcta={len(datos) == 6}, recuperaciones={bus.recuperaciones}, "
+          f"condiciones={i2c.condiciones}")
+    assert len(datos) == 6 and i2c.condiciones == ["STOP"] * bus.recuperaciones
+
+    antes = i2c.transacciones
+    ts = [bus.programar(0x44, b'\x2C\x06', 6, retardo_ms=15) for _ in range(3)]
+    bus.atender()
+    print(f"  3 lecturas programadas -> {(i2c.transacciones - antes) // 2} ejecutada(s), "
+          f"mismo resultado={ts[0] is ts[1] is ts[2] and ts[0].hecho}")
+    assert i2c.transacciones - antes == 2 and ts[0] is ts[2] and ts[0].hecho
+
+    # Como automatizar(): SHT30 y BH1750 programados, atendidos en la misma ranura
+    from bh1750 import BH1750
+    from compat import sleep_ms
+    luz = BH1750(bus)
+    t_luz = luz.programar()
+    assert bus.atender() == 0  # La conversión aún no ha terminado
+    sleep_ms(luz.conversion_ms())
+    t_sht = bus.programar(0x44, b'\x2C\x06', 6, retardo_ms=15)
+    assert luz.programar() is t_luz  # Pendiente: se fusiona, no se duplica
+    hechas = bus.atender()
+    lux = luz.recibir(t_luz)
+    assert hechas == 2 and t_sht.hecho and abs(lux - 800.0) <= 8.0
+    print(f"  SHT30 + BH1750 en una ranura: {hechas} transacciones, {lux:.1f} lx")
+    for addr, s in bus.estadisticas().items():
+        print(f"  0x{addr:02X}: {s}")
+    return bus
+
+
+def escenario_energia(horas=24, irq=False):
+    """ Riego automático con light-sleep y muestreo adaptativo durante
+    `horas` de reloj virtual, con el panel conectado o no a una línea
+    IRQ. Usa la misma ReglaRiego y plazos_automatizacion() que
+    automatizar() y main(), con GestorEnergia.dormir_hasta().
+    Comprueba que ningún riego se pasa de su duración por dormir de más
+    y que no se pierde ningún toque (de TOQUE_MS), e informa del
+    consumo estimado. """
+    from automatizacion import ReglaRiego, plazos_automatizacion
+    from power import GestorEnergia, MuestreoAdaptativo
+    COSTE_TICK_MS = 3  # Tiempo despierto por cada tick de automatización
+    TOQUE_MS = 150     # Duración de un toque corto sobre el panel
+
+    reloj = RelojVirtual()
+    pantalla = FakeDisplay()
+    toques = [10_000, 2 * 3_600_000, 2 * 3_600_000 + 20_000, 5 * 3_600_000 + 12_345]
+
+    def dormir(ms):
+        # Con IRQ, un toque despierta al chip antes de que venza el plazo
+        if irq and toques and reloj.ahora() <= toques[0] < reloj.ahora() + ms:
+            ms = toques[0] - reloj.ahora()
+        reloj.avanzar(ms)
+
+    energia = GestorEnergia(pantalla, reloj=reloj.ahora, dormir=dormir, esperar=reloj.avanzar)
+    energia.despierta_por_toque = irq  # En el chip lo activa el pin touch_irq
+    suelo = MuestreoAdaptativo(2000, 60000, umbral=1)
+    temp = MuestreoAdaptativo(2000, 60000, umbral=0.3)
+    regla = ReglaRiego(humedad_minima=30, duracion_ms=5000, intervalo_ms=10000)
+    perdidos = 0
+    humedad = 45.0
+    riegos, exceso_max = 0, 0
+    previo = 0
+    while reloj.ahora() < horas * 3_600_000:
+        ahora = reloj.ahora()
+        # Dinámica del suelo: se seca 0.5 %/min y sube 2 %/s regando
+        dt = ahora - previo
+        previo = ahora
+        humedad += dt * (2 / 1000 if regla.activo else -0.5 / 60_000)
+        if toques and ahora >= toques[0]:
+            if ahora < toques[0] + TOQUE_MS:
+                energia.actividad()
+            else:
+                perdidos += 1  # El panel ya no estaba pulsado al mirarlo
+            toques.pop(0)
+
+        # Como automatizar(): muestra de suelo, apertura y cierre
+        if suelo.toca(ahora):
+            h = int(humedad)
+            suelo.registrar(ahora, h)
+            if regla.muestra(ahora, h):
+                riegos += 1
+        inicio = regla.inicio
+        if regla.vencido(ahora):
+            exceso_max = max(exceso_max, ticks_diff(ahora, inicio) - regla.duracion_ms)
+        if temp.toca(ahora):
+            temp.registrar(ahora, 22.0)
+        reloj.avanzar(COSTE_TICK_MS)
+
+        energia.dormir_hasta(plazos_automatizacion((suelo, temp), regla))
+
+    print(f"Energía ({horas} h simuladas, {'con' if irq else 'sin'} IRQ táctil): {riegos} riegos, "
+          f"exceso máximo de riego {exceso_max} ms, {perdidos} toques perdidos")
+    print(f"  {energia.informe()}")
+    assert riegos > 0, "el escenario no llegó a regar"
+    assert exceso_max == 0, "un riego se pasó de su duración"
+    assert perdidos == 0, "se perdió un toque con la pantalla apagada"
+    return exceso_max
+
+
+def escenario_recuperacion(caida_ms=1500):
+    """ El watchdog reinicia el chip a mitad de un riego. Tras `caida_ms`
+    sin servicio, el arranque debe dejar los actuadores como estaban en
+    milisegundos y el riego terminar a su hora (error < 1 s, resolución
+    del RTC). Además, un punto de control de hace días o ilegible no
+    impide arrancar ni deja el riego abierto o bloqueado. """
+    import time
+    from automatizacion import ReglaRiego
+    from recovery import PuntoControl, EstadoControlador, restaurar
+    DURACION_MS = 5000
+    EPOCA = 1_700_000_000
+    PINES = (18, 8, 9)  # Riego, ferti, ventilador
+    memoria = FakeRTCMemoria()
+
+    # Primera vida: riego iniciado a los 100 s; el chip se cuelga 2.3 s después
+    reloj = RelojVirtual()
+    reloj.avanzar(100_000)
+    pc = PuntoControl(memoria, reloj=reloj.ahora, reloj_s=lambda: EPOCA + reloj.ahora() // 1000)
+    estado = EstadoControlador()
+    estado.actuadores = 0b001
+    estado.riego_activo = True
+    estado.riego_inicio = reloj.ahora()
+    estado.riego_fin = reloj.ahora() - 30_000
+    estado.calibracion = (210, 3880, 190, 3905)
+    pc.guardar(estado)
+    fin_esperado = 100_000 + DURACION_MS  # En el reloj de la primera vida
+    caida = reloj.ahora() + 2300
+
+    # Segunda vida: ticks_ms vuelve a 0, el RTC sigue contando. Se mide
+    # como en el programa principal: desde el punto de control hasta
+    # tener los pines de los actuadores fijados.
+    reloj2 = RelojVirtual()
+    reloj2.avanzar(350)  # Arranque de MicroPython hasta el script
+    base = caida + caida_ms
+    salidas = {}
+
+    def crear_salida(pin, valor):
+        salidas[pin] = valor
+        return pin
+
+    t0 = time.perf_counter()
+    pc2 = PuntoControl(memoria, reloj=reloj2.ahora,
+                       reloj_s=lambda: EPOCA + (base + reloj2.ahora()) // 1000)
+    restaurado, _ = restaurar(pc2, True, crear_salida, PINES)
+    restaurar_us = (time.perf_counter() - t0) * 1e6
+    assert restaurado is not None and restaurado.riego_activo
+    assert restaurado.actuadores == 0b001 and restaurado.calibracion == estado.calibracion
+    assert salidas == {18: 0, 8: 1, 9: 1}, "los actuadores no quedaron como estaban"
+    assert restaurar_us < 10_000, "la restauración no es de milisegundos"
+    # Fin del riego restaurado, expresado en el reloj de la primera vida
+    fin = base + ticks_diff(restaurado.riego_inicio + DURACION_MS, 0)
+    error_ms = fin - fin_esperado
+    assert abs(error_ms) < 1000, "el riego restaurado no termina a su hora"
+
+    # Caída de 7 días con el riego abierto: arranca y lo cierra en el primer tick
+    reloj3 = RelojVirtual()
+    reloj3.avanzar(350)
+    semana = 7 * 86_400_000
+    pc3 = PuntoControl(memoria, reloj=reloj3.ahora,
+                       reloj_s=lambda: EPOCA + (caida + semana + reloj3.ahora()) // 1000)
+    viejo = pc3.cargar()
+    assert 0 < ticks_diff(reloj3.ahora(), viejo.riego_inicio) <= (1 << 29) - 1
+    regla = ReglaRiego(0, DURACION_MS, 10_000)
+    regla.activo, regla.inicio, regla.fin = viejo.riego_activo, viejo.riego_inicio, viejo.riego_fin
+    reloj3.avanzar(5)
+    assert regla.vencido(reloj3.ahora()), "el riego restaurado de hace días sigue abierto"
+
+    # Último riego de hace más de ~6.2 días (medio periodo de ticks_ms): la
+    # edad se satura en lugar de guardarse como "hace 0 ms"
+    reloj4 = RelojVirtual()
+    reloj4.avanzar(semana)
+    memoria4 = FakeRTCMemoria()
+    pc4 = PuntoControl(memoria4, reloj=reloj4.ahora, reloj_s=lambda: EPOCA + reloj4.ahora() // 1000)
+    antiguo = EstadoControlador()
+    antiguo.riego_fin = 0
+    pc4.guardar(antiguo)
+    restaurado4 = pc4.cargar()
+    regla = ReglaRiego(0, DURACION_MS, 10_000)
+    regla.fin = restaurado4.riego_fin
+    assert regla.muestra(reloj4.ahora() + 5, 0), "el intervalo de riego se reinició al restaurar"
+
+    # Memoria vacía, corrupta o ilegible: arranque en frío con todo apagado
+    assert PuntoControl(FakeRTCMemoria()).cargar() is None
+    memoria.datos = memoria.datos[:-1] + bytes([memoria.datos[-1] ^ 1])
+    assert pc2.cargar() is None
+
+    def ilegible(datos=None):
+        raise OSError(5)
+
+    salidas.clear()
+    assert restaurar(PuntoControl(ilegible), True, crear_salida, PINES)[0] is None
+    assert salidas == {18: 1, 8: 1, 9: 1}
+
+    print(f"Recuperación: punto de control de {len(memoria.datos)} bytes y actuadores restaurados "
+          f"en {restaurar_us:.0f} us, error en el fin de riego {error_ms} ms")
+    return restaurar_us, error_ms
+
+
+if __name__ == "__main__":
+    escenario_bh1750()
+    escenario_bus()
+    escenario_energia()
+    escenario_energia(irq=True)
+    escenario_recuperacion()
@@ -0,0 +1,117 @@
+# Texto con atlas de glifos y escritura en bloque
+# ------------------------------------------------------------
+# Los glifos de la fuente 8x8 de framebuf se rasterizan una sola vez
+# por tamaño (x1, x2 y dígitos x3 para lecturas). Cada cadena se
+# compone en un búfer de trabajo preasignado con blit + paleta (en C)
+# y se envía a la pantalla con un único display.block(). Las
+# etiquetas fijas pueden quedar en caché ya compuestas.
+import framebuf
+from compat import ticks_us, ticks_diff
+
+ASCII = ''.join(chr(c) for c in range(32, 127))
+DIGITOS = " 0123456789.,-+%"  # Atlas grande sólo para lecturas numéricas
+
+
+def _rgb565_pantalla(color):
+    # framebuf guarda RGB565 en little-endian; el ILI9341 lo espera big-endian
+    return ((color & 0xFF) << 8) | (color >> 8)
+
+
+class AtlasGlifos:
+    """ Glifos de `caracteres` escalados x`escala`, 1 bit por píxel """
+
+    def __init__(self, escala=1, caracteres=ASCII):
+        self.escala = escala
+        self.ancho = self.alto = 8 * escala
+        tam = (self.ancho + 7) // 8 * self.alto
+        self._datos = bytearray(len(caracteres) * tam)
+        self._glifos = {}
+        base8 = framebuf.FrameBuffer(bytearray(8), 8, 8, framebuf.MONO_HLSB)
+        vista = memoryview(self._datos)
+        for n, ch in enumerate(caracteres):
+            base8.fill(0)
+            base8.text(ch, 0, 0, 1)
+            glifo = framebuf.FrameBuffer(vista[n * tam:(n + 1) * tam], self.ancho, self.alto, framebuf.MONO_HLSB)
+            for y in range(8):
+                for x in range(8):
+                    if base8.pixel(x, y):
+                        glifo.fill_rect(x * escala, y * escala, escala, escala, 1)
+            self._glifos[ch] = glifo
+        self._vacio = self._glifos.get(' ') or framebuf.FrameBuffer(bytearray(tam), self.ancho, self.alto, framebuf.MONO_HLSB)
+
+    def glifo(self, ch):
+        return self._glifos.get(ch, self._vacio)
+
+
+class MotorTexto:
+    def __init__(self, display, escalas=(1, 2), escala_digitos=3, cache_bytes=16384):
+        self.display = display
+        self.atlas = {e: AtlasGlifos(e) for e in escalas}
+        if escala_digitos:
+            self.atlas[escala_digitos] = AtlasGlifos(escala_digitos, DIGITOS)
+        alto_max = 8 * max(self.atlas)
+        self._trabajo = bytearray(display.width * alto_max * 2)
+        self._paleta = framebuf.FrameBuffer(bytearray(4), 2, 1, framebuf.RGB565)
+        self._cache = {}
+        self._cache_bytes = 0
+        self.cache_max_bytes = cache_bytes
+
+    def componer(self, texto, color, fondo, escala, destino):
+        """ Compone `texto` en `destino` (RGB565 listo para la pantalla).
+        Devuelve (ancho, alto) en píxeles. """
+        atlas = self.atlas[escala]
+        paso = atlas.ancho
+        ancho, alto = len(texto) * paso, atlas.alto
+        fb = framebuf.FrameBuffer(destino, ancho, alto, framebuf.RGB565)
+        self._paleta.pixel(0, 0, _rgb565_pantalla(fondo))
+        self._paleta.pixel(1, 0, _rgb565_pantalla(color))
+        for i in range(len(texto)):
+            fb.blit(atlas.glifo(texto[i]), i * paso, 0, -1, self._paleta)
+        return ancho, alto
+
+    def draw(self, x, y, texto, color, fondo=0, escala=1, cache=False):
+        """ Dibuja `texto` con una sola escritura SPI, recortado al borde
+        derecho. cache=True para etiquetas fijas: la cadena compuesta se
+        reutiliza en lugar de recomponerla. """
+        texto = texto[:max(0, self.display.width - x) // (8 * escala)]
+        if not texto:
+            return
+        if cache:
+            clave = (texto, color, fondo, escala)
+            hit = self._cache.get(clave)
+            if hit is None:
+                ancho, alto = self.componer(texto, color, fondo, escala, self._trabajo)
+                hit = (ancho, alto, bytes(memoryview(self._trabajo)[:ancho * alto * 2]))
+                if self._cache_bytes + len(hit[2]) > self.cache_max_bytes:
+                    self._cache.clear()
+                    self._cache_bytes = 0
+                self._cache[clave] = hit
+                self._cache_bytes += len(hit[2])
+            ancho, alto, datos = hit
+        else:
+            ancho, alto = self.componer(texto, color, fondo, escala, self._trabajo)
+            datos = memoryview(self._trabajo)[:ancho * alto * 2]
+        self.display.block(x, y, x + ancho - 1, y + alto - 1, datos)
+
+
+def comparar(display, texto="Temperatura: 25.31 C", repeticiones=50, motor=None):
+    """ Caracteres por segundo de draw_text8x8 frente al motor de atlas """
+    if motor is None:
+        motor = MotorTexto(display)
+    pruebas = (
+        ("draw_text8x8", lambda: display.draw_text8x8(0, 0, texto, 0xFFFF, 0)),
+        ("atlas x1", lambda: motor.draw(0, 0, texto, 0xFFFF, 0)),
+        ("atlas x1 cache", lambda: motor.draw(0, 0, texto, 0xFFFF, 0, cache=True)),
+        ("atlas x2", lambda: motor.draw(0, 0, texto, 0xFFFF, 0, escala=2)),
+        ("atlas x2 cache", lambda: motor.draw(0, 0, texto, 0xFFFF, 0, escala=2, cache=True)),
+    )
+    resultados = {}
+    for nombre, fn in pruebas:
+        fn()  # Calentar (y llenar la caché)
+        t0 = ticks_us()
+        for _ in range(repeticiones):
+            fn()
+        us = ticks_diff(ticks_us(), t0)
+        resultados[nombre] = len(texto) * repeticiones * 1_000_000 // max(1, us)
+        print(f"{nombre:>15}: {resultados[nombre]} car/s")
+    return resultados